@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Feed weeks of channel/IM/user churn through SlackClient.process_changes and
+report how many entities are held and how much memory they take.
+
+    python bench/entity_soak.py [days]
+
+Memory is measured with tracemalloc where available (python 3), otherwise only
+entity counts are reported. Both should level off instead of growing per day.
+"""
+
+import os
+import random
+import sys
+
+# import the client without going through bot/__init__ (and its config)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from slackclient import SlackClient
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+USERS = 5000
+CHANNELS = 300
+EVENTS_PER_DAY = 20000
+
+
+def day_of_events(rnd, day):
+    for _ in range(EVENTS_PER_DAY):
+        pick = rnd.random()
+        user = 'U%06d' % rnd.randrange(USERS)
+        channel = 'C%06d' % rnd.randrange(CHANNELS)
+        members = ['U%06d' % rnd.randrange(USERS) for _ in range(rnd.randrange(1, 200))]
+
+        if pick < 0.4:
+            # slack sends im_created again for IMs we've already seen
+            yield {'type': 'im_created', 'user': user, 'channel': {'id': 'D' + user[1:], 'user': user}}
+        elif pick < 0.55:
+            yield {'type': 'im_close', 'user': user, 'channel': 'D' + user[1:]}
+        elif pick < 0.75:
+            yield {'type': 'channel_created', 'channel': {'id': channel, 'name': 'chan-' + channel,
+                                                          'members': members}}
+        elif pick < 0.8:
+            yield {'type': 'channel_rename', 'channel': {'id': channel, 'name': 'chan-{}-{}'.format(channel, day)}}
+        else:
+            yield {'type': 'user_change', 'user': {'id': user, 'name': 'user-' + user, 'tz': 'Europe/Kyiv'}}
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 28
+    rnd = random.Random(0)
+    client = SlackClient('xoxb-soak')
+    # nothing to reload from in here
+    client.server.channels.load = None
+
+    if tracemalloc:
+        tracemalloc.start()
+
+    print('day  users  channels  evicted  memory')
+    for day in range(1, days + 1):
+        for event in day_of_events(rnd, day):
+            client.process_changes(event)
+
+        memory = '{:.1f} MiB'.format(tracemalloc.get_traced_memory()[0] / 2.0 ** 20) if tracemalloc else '-'
+        print('{:>3}  {:>5}  {:>8}  {:>7}  {}'.format(day, len(client.server.users), len(client.server.channels),
+                                                       client.server.channels.evictions, memory))
+
+
+if __name__ == '__main__':
+    main()
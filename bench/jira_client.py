@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""Time the commands' jira calls with the jira library and with jira_plugin.rest.
+
+    python bench/jira_client.py [threads] [rounds]
+
+Both clients talk to the console's in-memory jira (bot/fake_jira.py) on a
+local port, which keeps connections alive and counts them; it runs in this
+process, so it shares the GIL with the clients. Each thread takes a client
+from a Pool of `threads` clients, like the plugin does, and runs `rounds` of:
+show issue, show open (a search of the open issues), show projects and show
+statuses.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# the plugin helpers and the fake jira without going through bot/__init__ (and its config)
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot')
+sys.path.insert(0, os.path.join(ROOT, 'plugins', 'jira_plugin'))
+sys.path.insert(1, ROOT)
+
+from jira.client import JIRA
+from fake_jira import FakeJiraServer, MemoryJira
+from pool import Pool
+import rest
+
+
+def user(name):
+    return {'key': name, 'name': name, 'displayName': name.title(), 'active': True, 'timeZone': 'UTC',
+            'avatarUrls': dict(('{0}x{0}'.format(size), 'http://avatars/' + name) for size in (16, 24, 32, 48))}
+
+
+class BenchJira(MemoryJira):
+    """The console's jira, with descriptions, comments and the rest of what a
+    real issue carries. Nothing changes it, so each request is answered the
+    way it was the first time."""
+
+    def __init__(self, issues):
+        MemoryJira.__init__(self, issues)
+        self.answers = {}
+        for item in self.issues.values():
+            item['fields'].update({
+                'description': 'Steps to reproduce:\n1. open it\n2. it breaks\n' * 3,
+                'priority': {'id': '3', 'name': 'Major', 'iconUrl': 'http://icons/major'},
+                'reporter': user('bob'),
+                'comment': {'startAt': 0, 'maxResults': 2, 'total': 2, 'comments': [
+                    {'id': str(i), 'author': user('carol'), 'body': 'looking into it ' * 5,
+                     'created': '2015-06-01T13:00:00.000+0000'} for i in range(2)]},
+            })
+
+    def handle(self, method, path, query, body):
+        key = (method, path, query.get('_raw'))
+        if key not in self.answers:
+            self.answers[key] = MemoryJira.handle(self, method, path, query, body)
+        return self.answers[key]
+
+
+class BenchServer(FakeJiraServer):
+    def __init__(self, backend):
+        FakeJiraServer.__init__(self, backend)
+        # response -> body, so the fake's own json encoding stays out of the timings
+        self.bodies = {}
+
+    def encode(self, response):
+        body = self.bodies.get(id(response))
+        if body is None:
+            body = self.bodies[id(response)] = FakeJiraServer.encode(self, response)
+        return body
+
+
+def show(item):
+    # what utils.issue_info reads
+    fields = item.fields
+    assignee = fields.assignee and '{}: {}'.format(fields.assignee.key, fields.assignee.displayName)
+    return '{} {} {} {} {} {} {}'.format(item.key, fields.summary, fields.description,
+                                        ','.join(fields.labels or []), fields.issuetype, fields.status, assignee)
+
+
+def command_round(jira, number):
+    show(jira.issue('PROJ-{}'.format(number % 50 + 1)))
+    for item in jira.search_issues('project=PROJ and status not in (Done)'):
+        show(item)
+    [project.key for project in jira.projects()]
+    [status.name for status in jira.statuses()]
+
+
+def run(server, connect, threads, rounds):
+    pool = Pool(connect, threads)
+    connects = server.connects
+
+    def work(index):
+        for number in range(rounds):
+            with pool.connection() as jira:
+                command_round(jira, index * rounds + number)
+
+    started = time.time()
+    workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.time() - started, server.connects - connects
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    server = BenchServer(BenchJira(50)).start()
+
+    clients = [
+        ('jira library', lambda: JIRA({'server': server.url, 'check_update': False}, basic_auth=('bench', 'bench'))),
+        ('jira_plugin.rest', lambda: rest.Client(server.url, 'bench', 'bench')),
+    ]
+
+    commands = threads * rounds
+    print('{} threads, {} rounds of 4 commands each'.format(threads, rounds))
+    for name, connect in clients:
+        elapsed, connections = run(server, connect, threads, rounds)
+        print('{:<18} {:7.2f}s  {:7.2f}ms per round  {} connections'.format(
+            name, elapsed, 1000 * elapsed * threads / commands, connections))
+
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Time SlackClient.rtm_read on an event mix, with and without the type prefilter.
+
+    python bench/rtm_read.py [recorded_frames.txt]
+
+A recording is one raw RTM frame per line. Without one, a mix shaped like a
+busy workspace (mostly presence and typing) is generated.
+"""
+
+import json
+import os
+import random
+import sys
+import timeit
+
+# import the client without going through bot/__init__ (and its config)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from slackclient import SlackClient
+
+MIX = [
+    (60, lambda i: {'type': 'presence_change', 'user': 'U%06d' % i, 'presence': 'away'}),
+    (20, lambda i: {'type': 'user_typing', 'channel': 'C000001', 'user': 'U%06d' % i}),
+    (12, lambda i: {'type': 'message', 'channel': 'C000001', 'user': 'U%06d' % i,
+                    'text': 'just chatting about things ' * 4, 'ts': '%d.000100' % i}),
+    (3, lambda i: {'type': 'message', 'channel': 'C000001', 'user': 'U%06d' % i,
+                   'text': '!jira show issue PROJ-%d' % i, 'ts': '%d.000200' % i}),
+    (5, lambda i: {'type': 'reaction_added', 'user': 'U%06d' % i, 'reaction': 'fire',
+                   'item': {'type': 'message', 'channel': 'C000001', 'ts': '%d.000100' % i}}),
+]
+
+
+def generate(count):
+    weights = [w for w, _ in MIX]
+    makers = [m for _, m in MIX]
+    rnd = random.Random(0)
+    frames = []
+    for i in range(count):
+        pick = rnd.uniform(0, sum(weights))
+        for weight, maker in zip(weights, makers):
+            pick -= weight
+            if pick <= 0:
+                break
+        frames.append(json.dumps(maker(i)))
+    return frames
+
+
+class FakeServer(object):
+    def __init__(self, batch):
+        self.batch = batch
+
+    def websocket_safe_read(self):
+        return self.batch
+
+
+def run(frames, event_types, batch=50, repeat=5):
+    client = SlackClient('xoxb-bench')
+    if event_types is not None:
+        client.subscribe(*event_types)
+
+    batches = ['\n'.join(frames[i:i + batch]) for i in range(0, len(frames), batch)]
+
+    def read_all():
+        for b in batches:
+            client.server = FakeServer(b)
+            client.rtm_read()
+
+    return min(timeit.repeat(read_all, number=1, repeat=repeat)), client.skipped // repeat
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            frames = [line.strip() for line in f if line.strip()]
+    else:
+        frames = generate(50000)
+
+    full, _ = run(frames, None)
+    filtered, skipped = run(frames, ['message'])
+
+    print('frames:     {}'.format(len(frames)))
+    print('skipped:    {} ({:.0%})'.format(skipped, float(skipped) / len(frames)))
+    print('full parse: {:.1f} ms ({:.2f} us/frame)'.format(full * 1e3, full * 1e6 / len(frames)))
+    print('prefilter:  {:.1f} ms ({:.2f} us/frame)'.format(filtered * 1e3, filtered * 1e6 / len(frames)))
+    print('speedup:    {:.2f}x'.format(full / filtered))
+
+
+if __name__ == '__main__':
+    main()
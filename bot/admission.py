@@ -0,0 +1,102 @@
+import threading
+import time
+
+
+class TokenBucket(object):
+    """`rate` tokens a second, holding at most `burst` of them."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp", "warned")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+        # told the user to slow down since the bucket ran dry
+        self.warned = False
+
+    def fill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def ready(self, now):
+        self.fill(now)
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+        self.warned = False
+
+    def wait(self):
+        # seconds until there's a token again
+        return int((1 - self.tokens) / self.rate) + 1
+
+
+class Admission(object):
+    """Decides whether a command runs now: token buckets per user and per
+    channel, and a cap on expensive commands running at the same time."""
+
+    def __init__(self, config):
+        self.user_rate = (config.get("user_rate") or 0.5, config.get("user_burst") or 5)
+        self.channel_rate = (config.get("channel_rate") or 1, config.get("channel_burst") or 10)
+        self.expensive_commands = tuple(config.get("expensive_commands") or ())
+        self.max_expensive = config.get("max_expensive") or 0
+        self.max_pending = config.get("max_pending") or 0
+        self.lock = threading.Lock()
+        # (team, user or channel id) -> TokenBucket
+        self.buckets = {}
+        self.running = 0
+
+    def expensive(self, text):
+        return text.startswith(self.expensive_commands)
+
+    def admit(self, team, user, channel, text, pending=0):
+        """(None, None) when the command can run, otherwise ("throttled" or
+        "shed", reply), the reply None when the user was told already."""
+        now = time.time()
+
+        with self.lock:
+            if len(self.buckets) > 10000:
+                self.prune(now)
+
+            buckets = []
+            for key, (rate, burst) in (((team, user), self.user_rate), ((team, channel), self.channel_rate)):
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+                buckets.append(bucket)
+
+            # both have to have a token before either is spent
+            for bucket in buckets:
+                if not bucket.ready(now):
+                    # answer once, not every message of a flood
+                    if bucket.warned:
+                        return "throttled", None
+                    bucket.warned = True
+                    return "throttled", "Too many commands, try again in {}s".format(bucket.wait())
+
+            if self.max_pending and pending >= self.max_pending:
+                return "shed", "I'm busy, try again in a bit"
+
+            if self.expensive(text):
+                if self.max_expensive and self.running >= self.max_expensive:
+                    return "shed", "I'm busy, try again in a bit"
+                self.running += 1
+
+            for bucket in buckets:
+                bucket.take()
+
+        return None, None
+
+    def done(self, text):
+        # every admitted command ends here, answered or not
+        if self.expensive(text):
+            with self.lock:
+                self.running -= 1
+
+    def prune(self, now):
+        # full buckets are the same as new ones
+        for key, bucket in list(self.buckets.items()):
+            bucket.fill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.buckets[key]
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import atexit
 import copy
 import functools
 from glob import glob
@@ -9,9 +10,18 @@ import os
 import re
 import sys
 import time
-import traceback
+
+try:
+    # Try for Python3
+    import queue
+except ImportError:
+    # Looks like Python2
+    import Queue as queue
 
 from config import config
+from . import log, profiler
+from .admission import Admission
+from .dedup import Dedup, event_key
 from .slackclient import SlackClient
 
 
@@ -25,6 +35,24 @@ class Server(object):
         self.slack = slack
         self.config = config
         self.hooks = hooks
+        # messages posted by plugin threads, sent from the event loop
+        self.outbox = queue.Queue()
+        self.metrics = {"events": 0, "messages": 0, "responses": 0, "errors": 0, "duplicates": 0,
+                        "throttled": 0, "shed": 0}
+        # a WorkerPool when message hooks run in worker processes
+        self.workers = None
+        # commands already handled, shared by every workspace
+        self.dedup = None
+        # rate limits and the cap on expensive commands, also shared
+        self.admission = None
+
+    @property
+    def team(self):
+        login_data = self.slack.server.login_data
+        return login_data and login_data["team"]["id"]
+
+    def post(self, channel, message):
+        self.outbox.put((channel, message))
 
 
 class InvalidPluginDir(Exception):
@@ -32,36 +60,73 @@ class InvalidPluginDir(Exception):
         self.message = "Unable to find plugin dir {0}".format(plugindir)
 
 
-def init_server(args, config):
+def init_servers(args, config):
     init_log(config)
-    logger.debug("config: {0}".format(config))
+    logger.debug("config: %s", config)
 
+    # one set of plugins (and whatever they share) for every workspace
     hooks = init_plugins(args.pluginpath)
 
     try:
-        slack = SlackClient(config["slack_token"])
+        tokens = config.get("slack_tokens") or [config["slack_token"]]
     except KeyError:
         logger.error("Unable to find a slack token.")
         raise
-    server = Server(slack, config, hooks)
-    return server
+
+    dedup = None
+    if config.get("dedup_window"):
+        dedup = Dedup(config["dedup_window"], config.get("dedup_size") or 10000, config.get("dedup_file"))
+
+    # jira is shared, so is the limit on what runs against it
+    admission = Admission(config)
+
+    servers = []
+    for token in tokens:
+        slack = SlackClient(token, config.get("slack_im_cache_size", 200))
+        # everything else (presence, typing, ...) is skipped before decoding
+        slack.subscribe(*event_handlers)
+        server = Server(slack, config, hooks)
+        server.dedup = dedup
+        server.admission = admission
+        servers.append(server)
+    return servers
 
 
 def init_log(cfg):
-    loglevel = cfg.get("loglevel", logging.INFO)
-    logformat = cfg.get("logformat", '%(asctime)s:%(levelname)s:%(name)s:%(message)s')
+    loglevel = cfg.get("loglevel") or logging.INFO
+    logformat = cfg.get("logformat") or '%(asctime)s:%(levelname)s:%(name)s:%(message)s'
 
     if cfg.get("logfile"):
-        logging.basicConfig(filename=cfg.get("logfile"), format=logformat, level=loglevel)
+        handler = logging.FileHandler(cfg.get("logfile"))
+    else:
+        handler = logging.StreamHandler()
+
+    if logformat == "json":
+        handler.setFormatter(log.JsonFormatter())
     else:
-        logging.basicConfig(format=logformat, level=loglevel)
+        handler.setFormatter(logging.Formatter(logformat))
+
+    # keep file and stdout writes off the event thread
+    queuesize = cfg.get("logqueue", 10000)
+    if queuesize:
+        listener = log.QueueListener(queue.Queue(queuesize), handler)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = log.QueueHandler(listener.queue)
+
+    if cfg.get("logsample"):
+        handler.addFilter(log.SampleFilter(cfg.get("logsample")))
+
+    root = logging.getLogger()
+    root.setLevel(loglevel)
+    root.addHandler(handler)
 
 
 def init_plugins(plugindir):
     if not plugindir:
         plugindir = DIR("plugins")
 
-    logger.debug("plugindir: {0}".format(plugindir))
+    logger.debug("plugindir: %s", plugindir)
 
     if not os.path.isdir(plugindir):
         raise InvalidPluginDir(plugindir)
@@ -72,7 +137,7 @@ def init_plugins(plugindir):
     sys.path.insert(0, plugindir)
 
     for plugin in glob(os.path.join(plugindir, "[!_]*.py")):
-        logger.debug("plugin: {0}".format(plugin))
+        logger.debug("plugin: %s", plugin)
         try:
             mod = importlib.import_module(os.path.basename(plugin)[:-3])
             modname = mod.__name__
@@ -90,9 +155,7 @@ def init_plugins(plugindir):
         # bare except, because the modules could raise any number of errors
         # on import, and we want them not to kill our server
         except:
-            logger.warning("import failed on module {0}, module not loaded".format(plugin))
-            logger.warning("{0}".format(sys.exc_info()[0]))
-            logger.warning("{0}".format(traceback.format_exc()))
+            logger.warning("import failed on module %s, module not loaded", plugin, exc_info=True)
 
     sys.path = oldpath
     return hooks
@@ -106,18 +169,12 @@ def run_hook(hooks, hook, *args):
             if h:
                 responses.append(h)
         except:
-            logger.warning("Failed to run plugin {0}, module not loaded".format(hook))
-            logger.warning("{0}".format(sys.exc_info()[0]))
-            logger.warning("{0}".format(traceback.format_exc()))
+            logger.warning("Failed to run plugin %s, module not loaded", hook, exc_info=True)
 
     return responses
 
 
 def handle_event(event, server):
-    event_handlers = {
-        "message": handle_message,
-    }
-
     handler = event_handlers.get(event.get("type"))
     if handler:
         return handler(event, server)
@@ -141,28 +198,138 @@ def handle_message(event, server):
 
     # slack returns None if it can't find the user because it thinks it's ruby
     if not msguser:
-        logger.debug("event {0} has no user".format(event))
+        logger.debug("event %s has no user", event)
         return
 
     # don't respond to ourself or slackbot
     if msguser.name == botname or msguser.name.lower() == "slackbot":
         return
 
-    return '\n'.join(run_hook(server.hooks, "message", event, server))
+    # seen before, replayed after a reconnect or taken by another bot process
+    if server.dedup and not server.dedup.claim(event_key(event, server.team)):
+        server.metrics["duplicates"] += 1
+        logger.debug("skipping duplicate message %s", event.get("ts"))
+        return
+
+    server.metrics["messages"] += 1
 
+    done = None
+    if server.admission:
+        pending = len(server.workers.submitted) if server.workers else 0
+        verdict, reply = server.admission.admit(server.team, event["user"], event["channel"], message, pending)
+        if verdict:
+            server.metrics[verdict] += 1
+            logger.debug("%s message %s from %s", verdict, event.get("ts"), event["user"])
+            return reply
+        done = functools.partial(server.admission.done, message)
 
-def loop(server):
     try:
-        while True:
-            # This will cause a broken pipe to reveal itself
-            server.slack.server.ping()
+        # commands for the bot itself run here, next to the event loop
+        if message.split()[0] == "!bot":
+            return bot_command(message.split()[1:], msguser, server)
+
+        # the reply is sent once a worker comes back with it, the pool calls done then.
+        # reader_commands are answered here from what this process keeps in memory, like the issue index
+        if server.workers and not message.startswith(tuple(server.config.get("reader_commands") or ())):
+            server.workers.submit(server, event, done)
+            done = None
+            return
+
+        return '\n'.join(run_hook(server.hooks, "message", event, server))
+    finally:
+        if done:
+            done()
+
+
+def bot_command(args, user, server):
+    admins = server.config.get("admins") or []
+    if user.id not in admins and user.name not in admins:
+        return "Only bot admins can do that"
+
+    if args[:2] == ["profile", "start"]:
+        try:
+            profiler.start(server.config.get("profile_interval") or 0.01, "memory" in args[2:])
+        except RuntimeError as e:
+            return "Can't profile: {}".format(e)
+        return "Profiling, `!bot profile stop` writes the results"
+
+    if args[:2] == ["profile", "stop"]:
+        try:
+            paths = profiler.stop(server.config.get("profile_dir") or "profiles")
+        except RuntimeError as e:
+            return "Can't stop: {}".format(e)
+        return "Profile written to {}".format(", ".join(paths))
+
+    return "Usage: !bot profile start [memory] | !bot profile stop"
 
-            events = server.slack.rtm_read()
-            for event in events:
-                logger.debug("got {0}".format(event.get("type", event)))
-                response = handle_event(event, server)
-                if response:
-                    server.slack.rtm_send_message(event["channel"], response)
+
+event_handlers = {
+    "message": handle_message,
+}
+
+
+def send_outbox(server):
+    while True:
+        try:
+            channel, message = server.outbox.get_nowait()
+        except queue.Empty:
+            return
+        server.slack.rtm_send_message(channel, message)
+
+
+def read_events(server):
+    # This will cause a broken pipe to reveal itself
+    server.slack.server.ping()
+
+    events = server.slack.rtm_read()
+    server.metrics["events"] += len(events)
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for event in events:
+        if debug:
+            event_type = event.get("type")
+            logger.debug("got %s", event_type or event, extra={"event_type": event_type, "team": server.team})
+        response = handle_event(event, server)
+        if response:
+            server.metrics["responses"] += 1
+            server.slack.rtm_send_message(event["channel"], response)
+
+    send_outbox(server)
+
+
+def log_metrics(server):
+    metrics = dict(server.metrics, skipped=server.slack.skipped)
+    logger.info("metrics for %s: %s", server.team, metrics, extra={"team": server.team, "metrics": metrics})
+
+
+def log_workers(workers):
+    health = workers.health()
+    logger.info("workers: %s", health, extra={"workers": health})
+
+
+def loop(servers, workers=None):
+    interval = config.get("metrics_interval")
+    logged = time.time()
+
+    try:
+        while True:
+            for server in servers:
+                # a failing workspace shouldn't take the others down
+                try:
+                    read_events(server)
+                except Exception:
+                    server.metrics["errors"] += 1
+                    logger.warning("failed to read events for %s", server.team, exc_info=True)
+
+            if workers:
+                workers.collect(servers)
+
+            if interval and time.time() - logged >= interval:
+                logged = time.time()
+                for server in servers:
+                    log_metrics(server)
+                if workers:
+                    log_workers(workers)
 
             time.sleep(1)
     except KeyboardInterrupt:
@@ -174,12 +341,40 @@ def loop(server):
 
 
 def main(args):
-    server = init_server(args, config)
-
-    if server.slack.rtm_connect():
-        # run init hook. This hook doesn't send messages to the server (ought it?)
-        run_hook(server.hooks, "init", server)
-
-        loop(server)
-    else:
-        logger.warn("Connection Failed, invalid token <{0}>?".format(config["slack_token"]))
+    servers = []
+    workers = None
+    candidates = init_servers(args, config)
+
+    if getattr(args, "profile", False):
+        profiler.start(config.get("profile_interval") or 0.01, getattr(args, "profile_memory", False))
+
+        @atexit.register
+        def write_profile():
+            # unless `!bot profile stop` wrote it already
+            if profiler.current:
+                profiler.stop(config.get("profile_dir") or "profiles")
+
+    # worker processes are new interpreters, they load the plugins themselves but don't run their init hooks,
+    # command threads share the plugins (and whatever their init started) with the event loop
+    count = getattr(args, "workers", None) or config.get("workers")
+    threads = config.get("command_threads")
+    if count or (threads and candidates):
+        from .workers import WorkerPool
+
+        if count:
+            workers = WorkerPool(count, args.pluginpath, config)
+        else:
+            workers = WorkerPool(threads, args.pluginpath, config, candidates[0].hooks)
+        workers.start()
+
+    for server in candidates:
+        server.workers = workers
+        if server.slack.rtm_connect():
+            # run init hook. This hook doesn't send messages to the server (ought it?)
+            run_hook(server.hooks, "init", server)
+            servers.append(server)
+        else:
+            logger.warning("Connection Failed, invalid token <%s>?", server.slack.token)
+
+    if servers:
+        loop(servers, workers)
@@ -1,16 +1,86 @@
 __author__ = 'natalie'
 
+import os
+
 config = dict(jira_server=None,
               jira_user=None,
               jira_pass=None,
               jira_default_project=None,
               jira_default_issue_type='Bug',
               jira_default_labels=['fire', ],
+              jira_watch_file='jira_watches.json',
+              jira_watch_interval=60,
+              # 'rest' for the bot's own small client, 'jira' for the jira library
+              jira_client='rest',
+              jira_pool_size=4,
+              # clients for the background threads (index, users, watches, digests), apart from jira_pool_size
+              jira_background_pool_size=2,
+              # seconds a command waits for a free client before it's answered "busy"
+              jira_pool_timeout=10,
+              jira_issue_ttl=30,
+              jira_meta_ttl=300,
+              # projects `!jira find` searches, jira_default_project when empty
+              jira_index_projects=[],
+              jira_index_interval=300,
+              jira_find_limit=10,
+              # assignable users are read again this often, for @mentions in create, assign and comments
+              jira_user_interval=600,
+              # slack name -> jira name, for users whose names and full names differ
+              jira_user_map={},
+              # daily project summaries: [{'project': 'PROJ', 'channel': 'C123', 'time': '09:00'}, ...]
+              # 'team' picks the workspace when serving several
+              jira_digests=[],
+              # `!jira sprints` answers from memory for jira_sprint_ttl seconds, then fetches what changed,
+              # and everything again after jira_sprint_full_ttl
+              jira_sprint_ttl=60,
+              jira_sprint_full_ttl=900,
+              jira_sprint_limit=15,
+              jira_webhook_port=None,
+              # any other host needs jira_webhook_secret, jira posts to ...?secret=<it>
+              jira_webhook_host='127.0.0.1',
+              jira_webhook_secret=None,
               slack_token=None,
+              # serve several workspaces from one process, slack_token is used when empty
+              slack_tokens=[],
+              # IM channels kept in memory per workspace, others are fetched again when needed
+              slack_im_cache_size=200,
+              metrics_interval=300,
+              # run message hooks in this many worker processes, 0 runs them on command_threads threads
+              workers=0,
+              # without workers, commands run side by side on this many threads, 0 runs them in the event loop
+              command_threads=4,
+              # past it the channel is told, and the answer is posted whenever it comes
+              worker_timeout=60,
+              # answered in the event loop from what it keeps in memory (the issue index), not by a worker
+              reader_commands=['!jira find'],
+              # commands seen in the last dedup_window seconds are not run again (at most dedup_size of them),
+              # share dedup_file between bot processes on one host to run each command once
+              dedup_window=600,
+              dedup_size=10000,
+              dedup_file=None,
+              # commands a second and burst per user and per channel, over that the user is asked to slow down
+              user_rate=0.5,
+              user_burst=5,
+              channel_rate=1,
+              channel_burst=10,
+              # at most max_expensive of these run at once, and at most max_pending commands wait for a worker
+              expensive_commands=['!jira show issues', '!jira show open', '!jira show done', '!jira show fires',
+                                  '!jira find', '!jira digest', '!jira sprints'],
+              max_expensive=2,
+              max_pending=100,
+              # slack user names or ids allowed to run `!bot` commands
+              admins=[],
+              # where `!bot profile` and `bin/bot --profile` write, and seconds between stack samples
+              profile_dir='profiles',
+              profile_interval=0.01,
               loglevel=None,
               logformat=None,
-              logfile=None
+              logfile=None,
+              logqueue=10000,
+              logsample={'presence_change': 100, 'user_typing': 100},
               )
 
-if any([config.get(key) is None for key in ['jira_server', 'jira_user', 'jira_pass', 'slack_token']]):
+# bin/bot -t runs without slack, and checks jira's settings itself when it uses them
+if not os.environ.get('BOT_OFFLINE') and (any([config.get(key) is None for key in ['jira_server', 'jira_user', 'jira_pass']]) or \
+        not (config.get('slack_token') or config.get('slack_tokens'))):
     raise Exception('You should update config.py')
@@ -0,0 +1,171 @@
+"""Run the bot without slack: messages typed in or read from a script go
+through handle_event and the plugins, answers are printed with how long they
+took and how many jira requests they made."""
+
+import base64
+import json
+import sys
+import time
+
+from config import config
+from . import bot
+from .fake_jira import FakeJiraServer, MemoryJira, RecordingJira, ReplayJira
+from .slackclient import SlackClient
+
+try:
+    # Looks like Python2
+    input = raw_input
+except NameError:
+    pass
+
+TEAM = "TCONSOLE"
+CHANNEL = "CCONSOLE"
+USER = "UCONSOLE"
+
+# what rtm.start would say, jira's users are in slack under the same names
+LOGIN_DATA = {
+    "team": {"id": TEAM, "domain": "console"},
+    "self": {"id": "UBOT", "name": "bot"},
+    "channels": [{"id": CHANNEL, "name": "console", "members": [USER]}],
+    "groups": [],
+    "ims": [],
+    "users": [{"id": USER, "name": "you", "real_name": "You"},
+              {"id": "UALICE", "name": "alice", "real_name": "Alice"},
+              {"id": "UBOB", "name": "bob", "real_name": "Bob"},
+              {"id": "UCAROL", "name": "carol", "real_name": "Carol"}],
+}
+
+
+class ConsoleSlack(SlackClient):
+    """A SlackClient that never connects, what it sends is kept for the console to print."""
+
+    def __init__(self, login_data):
+        SlackClient.__init__(self, "console")
+        self.server.parse_slack_login_data(login_data)
+        self.sent = []
+
+    def rtm_send_message(self, channel, message):
+        self.sent.append((channel, message))
+
+
+class Stats(object):
+    def __init__(self):
+        # command -> [(seconds, jira requests)]
+        self.runs = {}
+
+    def add(self, text, seconds, requests):
+        command = " ".join(text.split()[:2])
+        self.runs.setdefault(command, []).append((seconds, requests))
+
+    def report(self):
+        lines = ["{:<20} {:>5} {:>9} {:>9} {:>9} {:>7}".format("command", "runs", "mean ms", "p50 ms", "max ms",
+                                                              "jira/run")]
+        for command, runs in sorted(self.runs.items()):
+            times = sorted(seconds for seconds, _ in runs)
+            lines.append("{:<20} {:>5} {:>9.1f} {:>9.1f} {:>9.1f} {:>7.1f}".format(
+                command, len(runs), 1000 * sum(times) / len(times), 1000 * times[len(times) // 2],
+                1000 * times[-1], float(sum(requests for _, requests in runs)) / len(runs)))
+        return "\n".join(lines)
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def start_jira(args):
+    # the plugin's own client talks to one of these, which counts its requests
+    if args.jira_replay:
+        backend = ReplayJira(args.jira_replay)
+    elif args.jira_live or args.jira_record:
+        if any(config.get(key) is None for key in ["jira_server", "jira_user", "jira_pass"]):
+            raise Exception("You should update config.py")
+        auth = base64.b64encode("{}:{}".format(config["jira_user"], config["jira_pass"]).encode("utf-8"))
+        headers = {"Authorization": "Basic " + auth.decode("ascii"), "Content-Type": "application/json"}
+        backend = RecordingJira(config["jira_server"], headers, args.jira_record)
+    else:
+        backend = MemoryJira()
+        # its issues are in PROJ, let !jira find search there
+        config["jira_index_projects"] = config.get("jira_index_projects") or ["PROJ"]
+
+    jira = FakeJiraServer(backend).start()
+    config.update(jira_server=jira.url, jira_user=config.get("jira_user") or "console",
+                  jira_pass=config.get("jira_pass") or "console")
+    return jira
+
+
+def message_event(line, ts):
+    # a recorded RTM event as it came in, or text from the console user
+    if line.startswith("{"):
+        return json.loads(line)
+    return {"type": "message", "channel": CHANNEL, "user": USER, "text": line, "ts": "{:.6f}".format(ts)}
+
+
+def run(server, jira, event, stats, out):
+    server.slack.process_changes(event)
+
+    before = jira.requests
+    started = time.time()
+    response = bot.handle_event(event, server)
+    elapsed = time.time() - started
+    requests = jira.requests - before
+
+    # plugin threads post through the outbox
+    bot.send_outbox(server)
+
+    for channel, message in server.slack.sent:
+        out.write("[{}] {}\n".format(channel, message))
+    del server.slack.sent[:]
+    if response:
+        out.write("{}\n".format(response))
+
+    if event.get("type") == "message" and (event.get("text") or "").startswith("!"):
+        stats.add(event["text"], elapsed, requests)
+        out.write("({:.1f}ms, {} jira requests)\n".format(1000 * elapsed, requests))
+
+
+def lines(args):
+    if args.script:
+        with (sys.stdin if args.script == "-" else open(args.script)) as f:
+            for line in f:
+                yield line
+        return
+
+    while True:
+        try:
+            yield input("> ")
+        except EOFError:
+            return
+
+
+def console(args):
+    jira = start_jira(args)
+    # watches made here are kept in memory, not in the bot's watch file
+    config["jira_watch_file"] = None
+
+    bot.init_log(dict(config, logfile=None, logqueue=0, loglevel=config.get("loglevel") or "WARNING"))
+    hooks = bot.init_plugins(args.pluginpath)
+
+    login_data = load_json(args.slack_login) if args.slack_login else LOGIN_DATA
+    server = bot.Server(ConsoleSlack(login_data), config, hooks)
+
+    # the init hooks start the plugins' background threads, their requests count too
+    if args.init:
+        bot.run_hook(hooks, "init", server)
+
+    stats = Stats()
+    out = sys.stdout
+    try:
+        for line in lines(args):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            run(server, jira, message_event(line, time.time()), stats, out)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if stats.runs:
+            out.write("\n{}\n".format(stats.report()))
+        if isinstance(jira.backend, RecordingJira):
+            jira.backend.save()
+        jira.close()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from .locks import file_lock
+
+
+def event_key(event, team):
+    # slack gives the same message the same ts (and client_msg_id) when it's replayed
+    return "{}:{}:{}".format(team, event.get("channel"), event.get("client_msg_id") or event.get("ts"))
+
+
+def fingerprint(key):
+    # 8 bytes of md5 as an int, stable across processes unlike hash()
+    return struct.unpack("<q", hashlib.md5(key.encode("utf-8")).digest()[:8])[0]
+
+
+class Dedup(object):
+    """Remembers event keys for `window` seconds, at most `capacity` of them.
+
+    With a `path` the keys are also appended to that file, so a restarted bot
+    or another bot process on the same host sees them too.
+    """
+
+    def __init__(self, window, capacity=10000, path=None):
+        self.window = window
+        self.capacity = capacity
+        self.path = path
+        self.lock = threading.Lock()
+        # (time, fingerprint), oldest first
+        self.ring = deque()
+        self.keys = set()
+        self.offset = 0
+        self.inode = None
+        # the file ends in the middle of a line
+        self.torn = False
+
+    def claim(self, key):
+        """True the first time a key is seen within the window."""
+        digest = fingerprint(key)
+        now = time.time()
+
+        with self.lock:
+            if not self.path:
+                return self.add(digest, now)
+
+            with file_lock(self.path):
+                with open(self.path, "a+") as f:
+                    self.catch_up(f)
+                    if not self.add(digest, now):
+                        return False
+                    f.write("{}{:.3f} {}\n".format("\n" if self.torn else "", now, digest))
+                    self.torn = False
+                    # our own line is already in the ring, don't read it back
+                    f.flush()
+                    self.offset = f.tell()
+
+                # lines are about 30 bytes, rewrite once most of them are expired
+                if self.offset > 64 * self.capacity:
+                    self.compact()
+            return True
+
+    def add(self, digest, now):
+        self.expire(now)
+        if digest in self.keys:
+            return False
+
+        self.ring.append((now, digest))
+        self.keys.add(digest)
+        return True
+
+    def expire(self, now):
+        ring = self.ring
+        while ring and (ring[0][0] < now - self.window or len(ring) >= self.capacity):
+            self.keys.discard(ring.popleft()[1])
+
+    def catch_up(self, f):
+        # read what other processes appended since we last looked
+        stat = os.fstat(f.fileno())
+        # inode numbers get reused, a replaced file can also be shorter than what was read
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # new or compacted file, start over
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.ring.clear()
+            self.keys.clear()
+            self.torn = False
+
+        f.seek(self.offset)
+        data = f.read()
+        if data:
+            self.torn = not data.endswith("\n")
+        for line in data.splitlines():
+            try:
+                stamp, digest = line.split()
+                stamp, digest = float(stamp), int(digest)
+            except ValueError:
+                # torn by a process killed mid-write, the rest of the file is fine
+                continue
+            if digest not in self.keys:
+                self.ring.append((stamp, digest))
+                self.keys.add(digest)
+        self.offset = f.tell()
+
+    def compact(self):
+        # keep only what's still in the window, in a new file
+        self.expire(time.time())
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp, "w") as f:
+            for stamp, digest in self.ring:
+                f.write("{:.3f} {}\n".format(stamp, digest))
+            self.offset = f.tell()
+        os.rename(tmp, self.path)
+        self.inode = os.stat(self.path).st_ino
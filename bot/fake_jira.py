@@ -0,0 +1,319 @@
+"""Local stand-ins for jira, for the console (bin/bot -t).
+
+Every backend is served over HTTP on a local port, so the plugin talks to it
+with its real client and each round trip can be counted.
+"""
+
+import calendar
+import json
+import re
+import socket
+import threading
+import time
+
+try:
+    # Try for Python3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+    import http.client as httplib
+except ImportError:
+    # Looks like Python2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+    import httplib
+
+DONE = ('Done', 'Closed', 'Resolved')
+
+
+def now():
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime())
+
+
+def error(status, message):
+    return status, {'errorMessages': [message]}
+
+
+class MemoryJira(object):
+    """A small jira kept in memory: a project with issues, users, statuses
+    and a scrum board, enough for every !jira command."""
+
+    def __init__(self, issues=30):
+        self.lock = threading.Lock()
+        self.url = ''
+        self.projects = [{'id': '1', 'key': 'PROJ', 'name': 'Project'}, {'id': '2', 'key': 'OTHER', 'name': 'Other'}]
+        self.statuses = [{'id': str(i), 'name': name, 'statusCategory': {'key': 'done' if name in DONE else 'new'}}
+                         for i, name in enumerate(['Open', 'In Progress', 'Done', 'Closed', 'Resolved'])]
+        self.users = [{'name': name, 'key': name, 'displayName': name.title(), 'active': True}
+                      for name in ('alice', 'bob', 'carol')]
+        self.issues = {}
+        self.comments = {}
+
+        for number in range(1, issues + 1):
+            status = ['Open', 'In Progress', 'Done'][number % 3]
+            self.add('PROJ', 'Summary number {} about the login page'.format(number), status,
+                     ['fire'] if number % 5 == 0 else [], self.users[number % 3] if number % 2 else None)
+
+    def add(self, project_key, summary, status='Open', labels=(), assignee=None):
+        key = '{}-{}'.format(project_key, len([k for k in self.issues if k.startswith(project_key + '-')]) + 1)
+        self.issues[key] = {'id': str(10000 + len(self.issues)), 'key': key, 'fields': {
+            'summary': summary, 'description': None, 'labels': list(labels),
+            'issuetype': {'name': 'Bug'}, 'project': {'key': project_key},
+            'status': self.status(status), 'assignee': assignee, 'created': now(), 'updated': now(),
+        }}
+        return key
+
+    def status(self, name):
+        return dict([s for s in self.statuses if s['name'] == name][0])
+
+    def issue(self, key):
+        return dict(self.issues[key], self=self.url + '/rest/api/2/issue/' + key)
+
+    def search(self, jql):
+        found = []
+        for key in sorted(self.issues, key=lambda key: int(key.split('-')[1])):
+            if self.matches(self.issues[key]['fields'], key, jql):
+                found.append(self.issue(key))
+        return found
+
+    def matches(self, fields, key, jql):
+        # the shapes the plugin sends: project=, key=, status (not) in, labels in, updated >= -Nm
+        for m in re.finditer(r'(\w+)\s*(=|not in|in|>=)\s*(\([^)]*\)|[^\s)]+)', jql):
+            name, op, value = m.groups()
+            values = [v.strip(' \'"') for v in value.strip('()').split(',')]
+
+            if name == 'project':
+                ok = fields['project']['key'] == values[0]
+            elif name == 'key':
+                ok = key == values[0]
+            elif name == 'status':
+                ok = (fields['status']['name'] in values) != (op == 'not in')
+            elif name == 'labels':
+                ok = bool(set(fields['labels']) & set(values))
+            elif name == 'updated' and values[0].startswith('-'):
+                updated = calendar.timegm(time.strptime(fields['updated'][:19], '%Y-%m-%dT%H:%M:%S'))
+                ok = updated >= time.time() - int(values[0][1:-1]) * 60
+            else:
+                ok = True
+
+            if not ok:
+                return False
+        return True
+
+    def handle(self, method, path, query, body):
+        with self.lock:
+            return self.route(method, path, query, body or {})
+
+    def route(self, method, path, query, body):
+        page = lambda items, key: {'startAt': int(query.get('startAt', 0)), 'total': len(items),
+                                   key: items[int(query.get('startAt', 0)):][:int(query.get('maxResults', 50))]}
+
+        if method == 'GET':
+            if path == 'api/2/serverInfo':
+                return 200, {'version': '6.4.0', 'versionNumbers': [6, 4, 0]}
+            if path == 'api/2/project':
+                return 200, self.projects
+            if path == 'api/2/status':
+                return 200, self.statuses
+            if path == 'api/2/search':
+                return 200, page(self.search(query.get('jql', '')), 'issues')
+            if path in ('api/2/user/assignable/multiProjectSearch', 'api/2/user/assignable/search'):
+                return 200, self.users[int(query.get('startAt', 0)):]
+            if path == 'api/2/user':
+                users = [u for u in self.users if u['name'] == query.get('username')]
+                return (200, users[0]) if users else error(404, 'The user named \'{}\' does not exist'.format(
+                    query.get('username')))
+            if path == 'agile/1.0/board':
+                return 200, {'isLast': True, 'values': [{'id': 1, 'name': 'PROJ board', 'type': 'scrum'}]
+                                                        if query.get('projectKeyOrId') in ('PROJ', None) else []}
+            if path == 'agile/1.0/board/1/sprint':
+                return 200, {'isLast': True, 'values': [{'id': 1, 'name': 'Sprint 1', 'state': 'active',
+                                                         'endDate': time.strftime('%Y-%m-%dT00:00:00.000Z',
+                                                                                  time.gmtime(time.time() + 5 * 86400))}]}
+            if path == 'agile/1.0/sprint/1/issue':
+                jql = 'project=PROJ ' + query.get('jql', '')
+                return 200, page(self.search(jql), 'issues')
+
+        m = re.match(r'api/2/issue/([\w-]+)(?:/(\w+))?$', path)
+        if m:
+            key, sub = m.groups()
+            if key not in self.issues:
+                return error(404, 'Issue Does Not Exist')
+            fields = self.issues[key]['fields']
+
+            if method == 'GET' and not sub:
+                return 200, self.issue(key)
+            if method == 'GET' and sub == 'transitions':
+                return 200, {'transitions': [{'id': s['id'], 'name': s['name'], 'to': {'name': s['name']}}
+                                             for s in self.statuses if s['name'] != fields['status']['name']]}
+            if method == 'POST' and sub == 'transitions':
+                fields['status'] = self.status([s['name'] for s in self.statuses
+                                                if s['id'] == str(body['transition']['id'])][0])
+                fields['updated'] = now()
+                return 204, None
+            if method == 'POST' and sub == 'comment':
+                self.comments.setdefault(key, []).append(body.get('body'))
+                return 201, {'id': str(len(self.comments[key])), 'body': body.get('body')}
+            if method == 'PUT' and sub == 'assignee':
+                fields['assignee'] = ([u for u in self.users if u['name'] == body.get('name')] or [None])[0]
+                fields['updated'] = now()
+                return 204, None
+            if method == 'PUT' and not sub:
+                for name, value in body.get('fields', {}).items():
+                    if name == 'assignee' and value:
+                        value = ([u for u in self.users if u['name'] == value.get('name')] or [None])[0]
+                    fields[name] = value
+                fields['updated'] = now()
+                return 204, None
+
+        if method == 'POST' and path == 'api/2/issue':
+            fields = body.get('fields', {})
+            key = self.add(fields['project']['key'], fields.get('summary'))
+            return 201, {'id': self.issues[key]['id'], 'key': key, 'self': self.url + '/rest/api/2/issue/' + key}
+
+        return error(404, 'Not in the console jira: {} {}'.format(method, path))
+
+
+class ReplayJira(object):
+    """Answers with responses recorded by RecordingJira. Writes that weren't
+    recorded succeed without an answer."""
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.recorded = json.load(f)
+
+    def handle(self, method, path, query, body):
+        key = request_key(method, path, query)
+        if key in self.recorded:
+            status, response = self.recorded[key]
+            return status, response
+        if method != 'GET':
+            return 204, None
+        return error(404, 'Not recorded: {}'.format(key))
+
+
+class RecordingJira(object):
+    """Passes requests on to a real jira, and keeps the answers for
+    ReplayJira when there's a `path` to save them to."""
+
+    def __init__(self, server, headers, path=None):
+        url = urlparse(server)
+        self.connection_class = httplib.HTTPSConnection if url.scheme == 'https' else httplib.HTTPConnection
+        self.host = url.netloc
+        self.base = url.path.rstrip('/') + '/rest/'
+        self.headers = headers
+        self.path = path
+        self.lock = threading.Lock()
+        self.recorded = {}
+
+    def handle(self, method, path, query, body):
+        conn = self.connection_class(self.host, timeout=30)
+        try:
+            url = self.base + path + ('?' + query['_raw'] if query.get('_raw') else '')
+            conn.request(method, url, json.dumps(body) if body is not None else None, self.headers)
+            response = conn.getresponse()
+            text = response.read().decode('utf-8')
+        finally:
+            conn.close()
+
+        answer = response.status, json.loads(text) if text else None
+        with self.lock:
+            self.recorded[request_key(method, path, query)] = answer
+        return answer
+
+    def save(self):
+        if self.path:
+            with open(self.path, 'w') as f:
+                json.dump(self.recorded, f, indent=1, sort_keys=True)
+
+
+def request_key(method, path, query):
+    params = '&'.join('{}={}'.format(k, query[k]) for k in sorted(query) if k != '_raw')
+    return '{} {}?{}'.format(method, path, params)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # one write per response, small writes stall on delayed acks, and
+    # don't hold back the end of a large one waiting for an ack either
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def answer(self):
+        url = urlparse(self.path)
+        path = url.path.split('/rest/', 1)[-1]
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        query['_raw'] = url.query
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+
+        self.server.count()
+        status, response = self.server.backend.handle(self.command, path, query, body)
+
+        data = self.server.encode(response) if response is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = answer
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeJiraServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, backend, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+        # keep-alive connections, their threads wait for the next request until closed
+        self.connections = set()
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        backend.url = self.url
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+    def encode(self, response):
+        return json.dumps(response).encode('utf-8')
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connects += 1
+            self.connections.add(request)
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        with self.lock:
+            self.connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def close(self):
+        self.shutdown()
+        with self.lock:
+            connections = list(self.connections)
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+        # let the handler threads see the end of their connections before the interpreter goes
+        deadline = time.time() + 1
+        while self.connections and time.time() < deadline:
+            time.sleep(0.01)
+        self.server_close()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='fake-jira')
+        thread.daemon = True
+        thread.start()
+        return self
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # no locking between processes on this platform
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """Holds an exclusive flock on `path`.lock, for files several bot processes write."""
+    with open(path + ".lock", "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,114 @@
+import json
+import logging
+import threading
+
+try:
+    # Try for Python3
+    import queue
+except ImportError:
+    # Looks like Python2
+    import Queue as queue
+
+
+# attributes every LogRecord carries, anything else came in through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | frozenset(['message', 'asctime'])
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, `extra` fields included as top level keys."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'name': record.name,
+            'message': record.getMessage(),
+        }
+
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+
+        return json.dumps(data, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Lets through one in `rates[event_type]` records of a sampled event type."""
+
+    def __init__(self, rates):
+        logging.Filter.__init__(self)
+        self.rates = rates
+        self.counts = {}
+
+    def filter(self, record):
+        event_type = getattr(record, 'event_type', None)
+        rate = self.rates.get(event_type)
+        if not rate or rate <= 1:
+            return True
+
+        count = self.counts.get(event_type, 0)
+        self.counts[event_type] = count + 1
+        if count % rate:
+            return False
+
+        record.sample_rate = rate
+        return True
+
+
+class QueueHandler(logging.Handler):
+    """Hands records over to a QueueListener. Never blocks: when the queue is
+    full the record is dropped and counted instead."""
+
+    def __init__(self, queue_):
+        logging.Handler.__init__(self)
+        self.queue = queue_
+        self.dropped = 0
+
+    def emit(self, record):
+        # resolve the message now, args (events mostly) may change before the
+        # listener gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class QueueListener(object):
+    """Drains a queue on its own thread and passes records to the handlers."""
+
+    def __init__(self, queue_, *handlers):
+        self.queue = queue_
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor, name='log-listener')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
@@ -5,6 +5,8 @@ import sys
 sys.path.append(os.path.dirname(__file__))
 
 from jira_plugin.commands import *
+from jira_plugin import rest, webhook
+from jira_plugin.pool import Pool, Busy
 from jira.client import JIRA
 from bot.config import config
 
@@ -17,9 +19,58 @@ commands = {'help': usage,
             'description': description,
             'status': status,
             'comment': comment,
-            'sprints': sprints
+            'sprints': sprints,
+            'find': find,
+            'digest': digest,
+            'watch': watch,
+            'unwatch': unwatch,
             }
 
+# these also get the message and server, to know where they came from
+message_commands = ('create', 'assign', 'description', 'comment', 'watch', 'unwatch')
+
+# team id -> bot server, for every workspace this process serves
+servers = {}
+
+
+def on_init(server):
+    first = not servers
+    servers[server.team] = server
+
+    # everything below is shared by all workspaces
+    if not first:
+        return
+
+    indexer.start(background, config.get('jira_index_interval'))
+    people.start(background, config.get('jira_user_interval'))
+    digests.start(background, post, config.get('jira_digests'))
+
+    port = config.get('jira_webhook_port')
+
+    # with webhooks jira pushes the changes, otherwise poll for them
+    if port:
+        webhook.subscribe(invalidate)
+        webhook.subscribe(indexer.index.apply)
+        webhook.subscribe(lambda event, payload: watcher.watches.apply(event, payload, post))
+        webhook.start(port, config.get('jira_webhook_host') or '127.0.0.1')
+    else:
+        watcher.start(background, post, config.get('jira_watch_interval'))
+
+
+def post(team, channel, message):
+    # configured channels may leave the team out when there is only one
+    server = servers.get(team)
+    if server is None and len(servers) == 1:
+        server = list(servers.values())[0]
+    if server:
+        server.post(channel, message)
+
+
+def invalidate(event, payload):
+    issue = payload.get('issue')
+    if issue:
+        cache.issues.pop(issue['key'])
+
 
 def on_message(msg, server):
     text = msg.get('text', '')
@@ -37,22 +88,39 @@ def on_message(msg, server):
 
     action = m.group(1)
     args = m.group(2)
-    return handle(action, args)
+    return handle(action, args, msg, server)
 
 
-def handle(command, args):
-    # we don't need api connection to show help :/
-    if command == 'help':
-        return usage()
-
+def connect():
     jira_username = config.get('jira_user')
     jira_password = config.get('jira_pass')
 
+    if config.get('jira_client') != 'jira':
+        return rest.Client(config.get('jira_server'), jira_username, jira_password)
+
     options = {
         'server': config.get('jira_server'),
     }
 
-    jira = JIRA(options, basic_auth=(jira_username, jira_password))
+    return JIRA(options, basic_auth=(jira_username, jira_password))
+
+
+pool = Pool(connect, config.get('jira_pool_size') or 1)
+# the indexer, user list, watcher and digests take theirs from here, so a long crawl never holds up a command
+background = Pool(connect, config.get('jira_background_pool_size') or 1)
+
+
+def handle(command, args, msg=None, server=None):
+    # we don't need api connection to show help :/
+    if command == 'help':
+        return usage()
+
+    try:
+        with pool.connection(config.get('jira_pool_timeout')) as jira:
+            if command in message_commands:
+                return commands[command](jira, args, msg or {}, server)
 
-    if commands.get(command):
-        return commands[command](jira, args)
+            if commands.get(command):
+                return commands[command](jira, args)
+    except Busy:
+        return utils.error('every Jira connection is busy, try again in a bit')
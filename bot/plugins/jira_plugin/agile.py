@@ -0,0 +1,135 @@
+__author__ = 'natalie'
+
+import threading
+import time
+
+from bot.config import config
+import cache
+import digest
+import utils
+
+FIELDS = 'summary,status,assignee,updated'
+
+
+def boards(jira, project_key):
+    # scrum boards of a project, they change about as often as projects do
+    return cache.meta.fetch(('boards', project_key), lambda: list(utils.agile_pages(
+        jira, 'board', {'projectKeyOrId': project_key, 'type': 'scrum'})))
+
+
+def is_done(fields):
+    status = fields.get('status') or {}
+    category = (status.get('statusCategory') or {}).get('key')
+    if category:
+        return category == 'done'
+    return status.get('name') in utils.DONE
+
+
+class SprintView(object):
+    """The active sprint of a board and its issues. Fetched in full now and
+    then, in between only the issues updated since the last fetch."""
+
+    def __init__(self, board):
+        self.board = board
+        self.lock = threading.Lock()
+        self.sprint = None
+        # issue key -> fields
+        self.issues = {}
+        self.fetched = 0
+        self.crawled = 0
+
+    def refresh(self, jira, ttl, full_ttl):
+        # callers arriving together wait for one fetch and share it
+        with self.lock:
+            now = time.time()
+            if now - self.fetched < ttl:
+                return
+
+            ended = self.sprint and self.sprint.get('endDate') and utils.parse_time(self.sprint['endDate']) < now
+            if not self.sprint or ended or now - self.crawled > full_ttl:
+                self.crawl(jira, now)
+            else:
+                self.update(jira, now)
+            self.fetched = now
+
+    def crawl(self, jira, now):
+        sprints = list(utils.agile_pages(jira, 'board/{}/sprint'.format(self.board['id']), {'state': 'active'}))
+        sprint = sprints[0] if sprints else None
+        issues = self.fetch(jira, sprint, {}) if sprint else {}
+
+        # kept only once it's all there, a failed crawl leaves the last one
+        self.sprint = sprint
+        self.issues = issues
+        self.crawled = now
+
+    def update(self, jira, now):
+        self.issues.update(self.fetch(jira, self.sprint, {'jql': utils.updated_since(self.fetched, now)}))
+
+    def fetch(self, jira, sprint, params):
+        path = 'sprint/{}/issue'.format(sprint['id'])
+        params = dict(params, fields=FIELDS)
+        return dict((issue['key'], issue['fields'])
+                    for issue in utils.agile_pages(jira, path, params, key='issues', page=100))
+
+    def summary(self, limit):
+        if not self.sprint:
+            return '{}: no active sprint'.format(self.board['name'])
+
+        issues = self.issues
+        done = sum(1 for fields in issues.values() if is_done(fields))
+        by_status = {}
+        for fields in issues.values():
+            name = digest.status_name(fields)
+            by_status[name] = by_status.get(name, 0) + 1
+
+        lines = ['{}: {}{}'.format(self.board['name'], self.sprint['name'], self.ends()),
+                 'progress: {}/{} done ({}%)'.format(done, len(issues), 100 * done // (len(issues) or 1)),
+                 'by status: {}'.format(digest.breakdown(by_status))]
+
+        # PROJ-2 before PROJ-10
+        remaining = sorted((key for key, fields in issues.items() if not is_done(fields)),
+                           key=lambda key: int(key.rsplit('-', 1)[1]))
+        for key in remaining[:limit]:
+            fields = issues[key]
+            assignee = fields.get('assignee')
+            lines.append('{} {} [{}] {}'.format(key, fields.get('summary'), digest.status_name(fields),
+                                                '@' + assignee['name'] if assignee else 'not assigned'))
+        if len(remaining) > limit:
+            lines.append('... and {} more'.format(len(remaining) - limit))
+
+        return '\n'.join(lines)
+
+    def ends(self):
+        end = self.sprint.get('endDate')
+        if not end:
+            return ''
+        days = int((utils.parse_time(end) - time.time()) // (24 * 60 * 60))
+        return ', ends {} ({} days left)'.format(end[:10], max(days, 0))
+
+
+# board id -> SprintView
+views = {}
+views_lock = threading.Lock()
+
+
+def view(board):
+    with views_lock:
+        if board['id'] not in views:
+            views[board['id']] = SprintView(board)
+        return views[board['id']]
+
+
+def sprints(jira, project_key):
+    found = boards(jira, project_key)
+
+    if not found:
+        return 'No scrum boards for {}'.format(project_key)
+
+    summaries = []
+    for board in found:
+        sprint = view(board)
+        sprint.refresh(jira, config.get('jira_sprint_ttl') or 0, config.get('jira_sprint_full_ttl') or 0)
+        with sprint.lock:
+            summaries.append(sprint.summary(config.get('jira_sprint_limit')))
+
+    return '\n\n'.join(summaries)
@@ -0,0 +1,72 @@
+__author__ = 'natalie'
+
+import threading
+import time
+from collections import OrderedDict
+
+from bot.config import config
+
+
+class TTLCache(object):
+    def __init__(self, ttl, size=1024):
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        # key -> (expires, value), oldest first since every entry lives for ttl
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key)
+
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            return entry[1]
+
+    def fetch(self, key, load):
+        # cached value, or load() it and cache that
+        value = self.get(key)
+        if value is None:
+            value = load()
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        # no ttl, nothing to keep
+        if self.ttl <= 0:
+            return
+
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = (time.time() + self.ttl, value)
+            self.prune()
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.data.pop(key, None)
+        return entry and entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def prune(self):
+        now = time.time()
+        while self.data:
+            key = next(iter(self.data))
+            if self.data[key][0] >= now and len(self.data) <= self.size:
+                return
+            del self.data[key]
+
+
+# issue key -> Issue, dropped when the bot or a webhook changes the issue. Not kept in
+# worker processes, changes made by the other workers and the webhooks never reach them
+issues = TTLCache(0 if config.get('worker') is not None else config.get('jira_issue_ttl') or 0)
+
+# projects, statuses and the like, rarely changed and the same for every workspace
+meta = TTLCache(config.get('jira_meta_ttl') or 0)
@@ -3,7 +3,14 @@ __author__ = 'natalie'
 import re
 from jira.utils import JIRAError
 from bot.config import config
+import agile
+import cache
+import digest as digests
+import indexer
+import people
+import rest
 import utils
+import watcher
 
 
 def usage():
@@ -21,7 +28,12 @@ def usage():
            '!jira assign @<user> <issue name>: sets issue assignee \n' + \
            '!jira description <issue name>: sets issue description \n' + \
            '!jira comment <issue name> <comment>: sets issue comment \n' + \
-           '!jira status <issue name> <status>: sets issue status \n'
+           '!jira status <issue name> <status>: sets issue status \n' + \
+           '!jira sprints <project name>: shows the active sprint, its progress and remaining issues \n' + \
+           '!jira digest <project name>: shows open, done and fire counts \n' + \
+           '!jira find <words>: searches issue keys, summaries and labels \n' + \
+           '!jira watch [<project name> [all|new|status|fires]]: posts project changes to this channel \n' + \
+           '!jira unwatch <project name> [all|new|status|fires]: stops posting project changes \n'
 
 
 def show(jira, args):
@@ -63,15 +75,25 @@ def show_issue(jira, args):
 
     issue_key = m.group(1)
     try:
-        issue = jira.issue(issue_key)
+        issue = cache.issues.get(issue_key)
+        if issue is None:
+            issue = jira.issue(issue_key)
+            cache.issues.set(issue_key, issue)
         return utils.issue_info(issue)
     except JIRAError as e:
         response = utils.error('{} {}'.format(str(e.status_code), str(e.text)))
         return response
 
 
-def create(jira, args):
-    m = re.match(r'(\w+)? ?(?:@(\w+))? (.*)', args)
+def assignee_error(project_key, mention, candidates):
+    message = 'User {} is not assignable in {}'.format(mention, project_key)
+    if candidates:
+        message += ', did you mean {}?'.format(', '.join([user['name'] for user in candidates[:5]]))
+    return utils.error(message)
+
+
+def create(jira, args, msg, server):
+    m = re.match(r'(\w+)? ?(?:{})? (.*)'.format(people.MENTION), args)
 
     if not m:
         return utils.not_valid_args(args)
@@ -81,18 +103,21 @@ def create(jira, args):
     if not project_key:
         return utils.error('Project name is required')
 
-    assignee = m.group(2)
-    summary = m.group(3)
-
-    fields = {
-        'project': {'key': project_key},
-        'summary': summary,
-        'issuetype': {'name': config.get('jira_default_issue_type')},
-    }
+    mention = m.group(2)
+    slack = people.slack_users(server)
 
     try:
-        if assignee:
-            jira.user(assignee)
+        assignee = None
+        if mention:
+            assignee, candidates = people.index.resolve(jira, project_key, mention, slack)
+            if not assignee:
+                return assignee_error(project_key, mention, candidates)
+
+        fields = {
+            'project': {'key': project_key},
+            'summary': people.index.translate(jira, project_key, m.group(3), slack),
+            'issuetype': {'name': config.get('jira_default_issue_type')},
+        }
 
         issue = jira.create_issue(fields=fields)
 
@@ -101,7 +126,7 @@ def create(jira, args):
 
         # weird, but user cannot be assigned during creation
         if assignee:
-            issue.update(assignee={'name': assignee})
+            issue.update(assignee={'name': assignee['name']})
 
         return utils.issue_info(issue)
     except JIRAError as e:
@@ -132,6 +157,7 @@ def close(jira, args):
             return utils.error('Operation not permitted')
 
         jira.transition_issue(issue, transition_id, comment=comment)
+        cache.issues.pop(issue_key)
         issue = jira.issue(issue_key)
 
         return utils.issue_info(issue)
@@ -154,7 +180,7 @@ def status(jira, args):
 
     try:
         issue = jira.issue(issue_key)
-        statuses = jira.statuses()
+        statuses = utils.statuses(jira)
 
         if issue_status not in [s.name for s in statuses]:
             return utils.error('Status {} does not exist'.format(issue_status))
@@ -169,6 +195,7 @@ def status(jira, args):
             return utils.error('Operation not permitted')
 
         jira.transition_issue(issue, transition_id)
+        cache.issues.pop(issue_key)
         issue = jira.issue(issue_key)
 
         return utils.issue_info(issue)
@@ -177,17 +204,23 @@ def status(jira, args):
         return response
 
 
-def assign(jira, args):
-    m = re.match(r"(?:@(\w+)) (\w+-\d+)", args)
+def assign(jira, args, msg, server):
+    m = re.match(r"{} (\w+-\d+)".format(people.MENTION), args)
 
     if not m:
         return utils.not_valid_args(args)
 
-    user = m.group(1)
+    mention = m.group(1)
     issue_id = m.group(2)
+    project_key = issue_id.split('-')[0]
 
     try:
-        jira.assign_issue(issue_id, user)
+        user, candidates = people.index.resolve(jira, project_key, mention, people.slack_users(server))
+        if not user:
+            return assignee_error(project_key, mention, candidates)
+
+        jira.assign_issue(issue_id, user['name'])
+        cache.issues.pop(issue_id)
 
         issue = jira.issue(issue_id)
         return utils.issue_info(issue)
@@ -196,7 +229,7 @@ def assign(jira, args):
         return response
 
 
-def description(jira, args):
+def description(jira, args, msg, server):
     m = re.match(r"(\w+-\d+) (.*)", args)
 
     if not m:
@@ -207,7 +240,9 @@ def description(jira, args):
 
     try:
         issue = jira.issue(issue_id)
+        description = people.index.translate(jira, issue_id.split('-')[0], description, people.slack_users(server))
         issue.update(description=description)
+        cache.issues.pop(issue_id)
 
         return utils.issue_info(issue)
     except JIRAError as e:
@@ -215,7 +250,7 @@ def description(jira, args):
         return response
 
 
-def comment(jira, args):
+def comment(jira, args, msg, server):
     m = re.match(r"(\w+-\d+) (.*)", args)
 
     if not m:
@@ -228,6 +263,7 @@ def comment(jira, args):
         return utils.error('Leave a comment')
 
     try:
+        comment = people.index.translate(jira, issue_id.split('-')[0], comment, people.slack_users(server))
         jira.add_comment(issue_id, comment)
     except JIRAError as e:
         response = utils.error('{} {}'.format(str(e.status_code), str(e.text)))
@@ -235,7 +271,7 @@ def comment(jira, args):
 
 
 def projects(jira, args):
-    projects = jira.projects()
+    projects = utils.projects(jira)
     return '\n'.join([utils.project_info(project) for project in projects])
 
 
@@ -253,7 +289,7 @@ def issues(jira, args):
     if not utils.check_project(jira, project_key):
         return utils.error('Project {} does not exist'.format(project_key))
 
-    query = 'project={}'.format(project_key)
+    query = utils.project_query('issues', project_key)
     issues = jira.search_issues(query)
 
     if not issues:
@@ -276,7 +312,7 @@ def open_issues(jira, args):
     if not utils.check_project(jira, project_key):
         return utils.error('Project {} does not exist'.format(project_key))
 
-    query = 'project={} and status not in (\'Done\', \'Closed\', \'Resolved\')'.format(project_key)
+    query = utils.project_query('open', project_key)
     issues = jira.search_issues(query)
 
     if not issues:
@@ -299,7 +335,7 @@ def done_issues(jira, args):  # todo
     if not utils.check_project(jira, project_key):
         return utils.error('Project {} does not exist'.format(project_key))
 
-    query = 'project={} and status in (\'Done\', \'Closed\', \'Resolved\')'.format(project_key)
+    query = utils.project_query('done', project_key)
     issues = jira.search_issues(query)
 
     if not issues:
@@ -323,7 +359,7 @@ def fires(jira, args):
         return utils.error('Project {} does not exist'.format(project_key))
 
     try:
-        query = 'project={0} and labels in (fire)'.format(project_key)
+        query = utils.project_query('fires', project_key)
         issues = jira.search_issues(query)
 
         if not issues:
@@ -337,7 +373,7 @@ def fires(jira, args):
 
 def statuses(jira, args):
     try:
-        statuses = jira.statuses()
+        statuses = utils.statuses(jira)
         return ','.join([status.name for status in statuses])
     except JIRAError as e:
         response = utils.error('{} {}'.format(str(e.status_code), str(e.text)))
@@ -359,12 +395,119 @@ def users(jira, args):
         return utils.error('Project {} does not exist'.format(project_key))
 
     try:
-        users = jira.search_assignable_users_for_projects('', project_key)
-        return '\n'.join([utils.user_info(user) for user in users])
+        users = people.index.users(jira, project_key).users
+        return '\n'.join([utils.user_info(rest.Record(user)) for user in users])
     except JIRAError as e:
         response = utils.error('{} {}'.format(str(e.status_code), str(e.text)))
         return response
 
 
 def sprints(jira, args):
-    return utils.error('Not implemented yet')
+    m = re.match(r'(\w+)?', args)
+
+    if not m:
+        return utils.not_valid_args(args)
+
+    project_key = m.group(1) or config.get('jira_default_project')
+
+    if not project_key:
+        return utils.error('Project name is required')
+
+    if not utils.check_project(jira, project_key):
+        return utils.error('Project {} does not exist'.format(project_key))
+
+    try:
+        return agile.sprints(jira, project_key)
+    except JIRAError as e:
+        response = utils.error('{} {}'.format(str(e.status_code), str(e.text)))
+        return response
+
+
+def digest(jira, args):
+    m = re.match(r'(\w+)?', args)
+
+    if not m:
+        return utils.not_valid_args(args)
+
+    project_key = m.group(1) or config.get('jira_default_project')
+
+    if not project_key:
+        return utils.error('Project name is required')
+
+    if not utils.check_project(jira, project_key):
+        return utils.error('Project {} does not exist'.format(project_key))
+
+    try:
+        return digests.digest(jira, project_key)
+    except JIRAError as e:
+        response = utils.error('{} {}'.format(str(e.status_code), str(e.text)))
+        return response
+
+
+def find(jira, args):
+    if not args.strip():
+        return utils.not_valid_args(args)
+
+    projects = indexer.projects()
+
+    if not projects:
+        return utils.error('No projects to search, set jira_index_projects')
+
+    # kept fresh by the indexer thread, worker processes don't run one
+    if indexer.running():
+        if not indexer.index.refreshed:
+            return 'The issue index is warming up, try again in a minute'
+    else:
+        try:
+            indexer.index.refresh_stale(jira, projects, 2 * config.get('jira_index_interval'))
+        except JIRAError as e:
+            return utils.error('{} {}'.format(str(e.status_code), str(e.text)))
+
+    results = indexer.index.search(args, config.get('jira_find_limit'))
+
+    if not results:
+        return 'No issues found'
+
+    return '\n'.join(['{}: {} [{}] {}'.format(key, summary, status, utils.issue_link(key))
+                      for key, summary, status in results])
+
+
+def watch(jira, args, msg, server):
+    m = re.match(r'(\w+)? ?({})?$'.format('|'.join(watcher.KINDS)), args)
+
+    if not m:
+        return utils.not_valid_args(args)
+
+    project_key = m.group(1)
+    kind = m.group(2) or 'all'
+    channel = msg.get('channel')
+
+    if not project_key:
+        watches = watcher.watches.channel_watches(server.team, channel)
+
+        if not watches:
+            return 'No watches in this channel'
+
+        return '\n'.join(['{}: {}'.format(w['project'], w['kind']) for w in watches])
+
+    if not utils.check_project(jira, project_key):
+        return utils.error('Project {} does not exist'.format(project_key))
+
+    if not watcher.watches.add(server.team, channel, project_key, kind):
+        return utils.error('Already watching {} ({})'.format(project_key, kind))
+
+    return 'Watching {} ({}) in this channel'.format(project_key, kind)
+
+
+def unwatch(jira, args, msg, server):
+    m = re.match(r'(\w+) ?({})?$'.format('|'.join(watcher.KINDS)), args)
+
+    if not m:
+        return utils.not_valid_args(args)
+
+    project_key = m.group(1)
+
+    if not watcher.watches.remove(server.team, msg.get('channel'), project_key, m.group(2)):
+        return utils.error('Not watching {}'.format(project_key))
+
+    return 'Stopped watching {}'.format(project_key)
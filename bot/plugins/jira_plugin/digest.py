@@ -0,0 +1,86 @@
+__author__ = 'natalie'
+
+import logging
+import threading
+import time
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+# how often the scheduler looks for digests that are due
+CHECK = 30
+
+
+def status_name(fields):
+    return (fields.get('status') or {}).get('name')
+
+
+def assignee_name(fields):
+    assignee = fields.get('assignee')
+    return assignee['name'] if assignee else 'unassigned'
+
+
+def breakdown(counts):
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return ', '.join(['{} {}'.format(name, number) for name, number in ranked]) or 'none'
+
+
+def digest(jira, project_key):
+    # totals are count-only searches, the breakdowns one scan of two fields
+    totals = [(kind, utils.count(jira, utils.project_query(kind, project_key))) for kind in ('open', 'done', 'fires')]
+    by_status, by_assignee = utils.group_by(jira, utils.project_query('open', project_key), 'status,assignee',
+                                            status_name, assignee_name)
+
+    return '{} digest: {}\nopen by status: {}\nopen by assignee: {}'.format(
+        project_key,
+        ', '.join(['{} {}'.format(number, kind) for kind, number in totals]),
+        breakdown(by_status),
+        breakdown(by_assignee))
+
+
+def next_run(at, now):
+    # next time it is `at` ("HH:MM", local time)
+    hour, minute = [int(part) for part in at.split(':')]
+    today = time.localtime(now)
+    run = time.mktime((today.tm_year, today.tm_mon, today.tm_mday, hour, minute, 0, 0, 0, -1))
+    if run <= now:
+        run += 24 * 60 * 60
+    return run
+
+
+thread = None
+
+
+def start(pool, post, digests):
+    # digests: [{'project': ..., 'channel': ..., 'time': 'HH:MM', 'team': ...}, ...]
+    global thread
+
+    if thread or not digests:
+        return
+
+    def run():
+        runs = [next_run(d.get('time', '09:00'), time.time()) for d in digests]
+
+        while True:
+            time.sleep(CHECK)
+            now = time.time()
+            # several channels can get the same project, compute it once
+            texts = {}
+
+            for i, d in enumerate(digests):
+                if now < runs[i]:
+                    continue
+                runs[i] = next_run(d.get('time', '09:00'), now)
+
+                try:
+                    if d['project'] not in texts:
+                        with pool.connection() as jira:
+                            texts[d['project']] = digest(jira, d['project'])
+                    post(d.get('team'), d['channel'], texts[d['project']])
+                except Exception:
+                    logger.warning("digest for %s failed", d['project'], exc_info=True)
+
+    thread = threading.Thread(target=run, name='jira-digest')
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,224 @@
+__author__ = 'natalie'
+
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+
+from bot.config import config
+import utils
+
+logger = logging.getLogger(__name__)
+
+FIELDS = 'summary,status,labels,updated'
+WORD = re.compile(r'\w+', re.UNICODE)
+ISSUE_KEY = re.compile(r'^\w+-\d+$', re.UNICODE)
+
+# a match in the key counts more than one in a label, more than one in the summary
+KEY_WEIGHT = 3
+LABEL_WEIGHT = 2
+SUMMARY_WEIGHT = 1
+
+# a short prefix can match thousands of terms, only the most common ones count
+MAX_EXPANSIONS = 32
+
+
+def tokens(text):
+    return [word.lower() for word in WORD.findall(text or '')]
+
+
+def key_tokens(key):
+    # PROJ-12 can be found as proj-12, proj or 12
+    key = key.lower()
+    return [key] + key.split('-')
+
+
+def query_words(query):
+    # (word, is prefix) pairs, the last word is probably still being typed
+    words = []
+    for chunk in query.lower().split():
+        word = chunk.rstrip('*')
+        parts = [word] if ISSUE_KEY.match(word) else tokens(word)
+        words.extend((part, chunk.endswith('*')) for part in parts)
+
+    if words:
+        words[-1] = (words[-1][0], True)
+    return words
+
+
+class IssueIndex(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        # issue key -> (summary, status)
+        self.docs = {}
+        # term -> {issue key: weight}
+        self.postings = {}
+        # issue key -> its terms, to take them out again on update
+        self.terms = {}
+        # sorted terms, for prefix lookups
+        self.vocabulary = []
+        # project -> unix time of the last crawl
+        self.watermarks = {}
+        self.refreshed = 0
+        # held for a whole crawl, so there's only ever one
+        self.refreshing = threading.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, issue):
+        fields = issue['fields']
+        key = issue['key']
+
+        weights = {}
+        for term in tokens(fields.get('summary')):
+            weights[term] = weights.get(term, 0) + SUMMARY_WEIGHT
+        for label in fields.get('labels') or ():
+            for term in tokens(label):
+                weights[term] = weights.get(term, 0) + LABEL_WEIGHT
+        for term in key_tokens(key):
+            weights[term] = weights.get(term, 0) + KEY_WEIGHT
+
+        with self.lock:
+            self._remove(key)
+            self.docs[key] = (fields.get('summary'), (fields.get('status') or {}).get('name'))
+            self.terms[key] = tuple(weights)
+            for term, weight in weights.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    bisect.insort(self.vocabulary, term)
+                postings[key] = weight
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        self.docs.pop(key, None)
+        for term in self.terms.pop(key, ()):
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def expand(self, prefix):
+        vocabulary = self.vocabulary
+        i = bisect.bisect_left(vocabulary, prefix)
+        terms = []
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            terms.append(vocabulary[i])
+            i += 1
+
+        if len(terms) > MAX_EXPANSIONS:
+            terms = heapq.nlargest(MAX_EXPANSIONS, terms, key=lambda term: len(self.postings[term]))
+        return terms
+
+    def search(self, query, limit=10):
+        scores = {}
+        matched = {}
+
+        with self.lock:
+            total = len(self.docs) or 1
+
+            for word, prefix in query_words(query):
+                if prefix:
+                    terms = self.expand(word)
+                else:
+                    terms = [word] if word in self.postings else []
+
+                hits = {}
+                for term in terms:
+                    postings = self.postings[term]
+                    idf = math.log(1.0 + float(total) / len(postings))
+                    # exact matches beat prefix matches
+                    boost = 1.0 if term == word else 0.5
+                    for key, weight in postings.items():
+                        hits[key] = max(hits.get(key, 0), weight * idf * boost)
+
+                for key, score in hits.items():
+                    scores[key] = scores.get(key, 0) + score
+                    matched[key] = matched.get(key, 0) + 1
+
+            # issues matching more of the words first, then by score
+            ranked = heapq.nsmallest(limit, scores, key=lambda key: (-matched[key], -scores[key], key))
+            return [(key,) + self.docs[key] for key in ranked]
+
+    def refresh(self, jira, projects):
+        with self.refreshing:
+            self._refresh(jira, projects)
+
+    def refresh_stale(self, jira, projects, age):
+        # callers arriving during a crawl wait for it instead of starting another
+        with self.refreshing:
+            if self.stale(age):
+                self._refresh(jira, projects)
+
+    def _refresh(self, jira, projects):
+        for project in projects:
+            started = time.time()
+            since = self.watermarks.get(project)
+
+            if since is None:
+                query = utils.project_query('issues', project)
+            else:
+                query = 'project={} and {}'.format(project, utils.updated_since(since, started))
+
+            # pages are read with startAt, an order that updates can't change keeps them from shifting
+            query += ' order by key asc'
+
+            for issue in utils.search_raw(jira, query, FIELDS):
+                self.add(issue)
+
+            self.watermarks[project] = started
+
+        self.refreshed = time.time()
+
+    def stale(self, age):
+        return time.time() - self.refreshed > age
+
+    def apply(self, event, payload):
+        issue = payload.get('issue')
+        if not issue or issue['key'].split('-')[0] not in projects():
+            return
+
+        if event == 'jira:issue_deleted':
+            self.remove(issue['key'])
+        else:
+            self.add(issue)
+
+
+def projects():
+    return config.get('jira_index_projects') or [p for p in [config.get('jira_default_project')] if p]
+
+
+index = IssueIndex()
+thread = None
+
+
+def running():
+    return bool(thread and thread.is_alive())
+
+
+def start(pool, interval):
+    global thread
+
+    if thread or not projects():
+        return
+
+    def run():
+        while True:
+            try:
+                with pool.connection() as jira:
+                    index.refresh(jira, projects())
+            except Exception:
+                logger.warning("issue index refresh failed", exc_info=True)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='jira-index')
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,168 @@
+__author__ = 'natalie'
+
+import bisect
+import logging
+import re
+import threading
+import time
+
+from bot.config import config
+import indexer
+
+logger = logging.getLogger(__name__)
+
+# how slack sends a mention (<@U123> or <@U123|name>), or one typed as @name
+MENTION = r'(<@\w+(?:\|[^>]*)?>|@[\w.\-]+)'
+SLACK_MENTION = re.compile(r'<@(\w+)(?:\|[^>]*)?>')
+
+# a name that isn't in the index is looked up again if the index is older than this
+MISS_AGE = 60
+
+
+class ProjectUsers(object):
+    """Assignable users of one project, by jira name, display name and prefix."""
+
+    def __init__(self, users):
+        self.users = users
+        self.by_name = dict((user['name'].lower(), user) for user in users)
+        self.by_display = {}
+        for user in users:
+            self.by_display.setdefault((user.get('displayName') or '').lower(), []).append(user)
+
+        # (term, name) for prefix lookups, the name and each word of the display name
+        terms = set()
+        for user in users:
+            name = user['name'].lower()
+            terms.add((name, name))
+            for word in (user.get('displayName') or '').lower().split():
+                terms.add((word, name))
+        self.terms = sorted(terms)
+        self.refreshed = time.time()
+
+    def find(self, prefix):
+        prefix = prefix.lower()
+        i = bisect.bisect_left(self.terms, (prefix,))
+        names = []
+        while i < len(self.terms) and self.terms[i][0].startswith(prefix):
+            if self.terms[i][1] not in names:
+                names.append(self.terms[i][1])
+            i += 1
+        return [self.by_name[name] for name in names]
+
+    def from_slack(self, slack_user):
+        override = (config.get('jira_user_map') or {}).get(slack_user.name)
+        for name in (override, slack_user.name):
+            if name and name.lower() in self.by_name:
+                return self.by_name[name.lower()]
+
+        # same full name on both sides, if nobody else has it
+        matches = self.by_display.get((slack_user.real_name or '').lower(), [])
+        return matches[0] if slack_user.real_name and len(matches) == 1 else None
+
+
+class UserIndex(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        # project key -> ProjectUsers
+        self.projects = {}
+
+    def fetch(self, jira, project_key, page=1000):
+        users = []
+        while True:
+            found = jira._get_json('user/assignable/multiProjectSearch', params={
+                'username': '', 'projectKeys': project_key, 'startAt': len(users), 'maxResults': page})
+            users.extend(found)
+            if len(found) < page:
+                break
+
+        users = ProjectUsers(users)
+        with self.lock:
+            self.projects[project_key] = users
+        return users
+
+    def users(self, jira, project_key):
+        # fetched once here, kept fresh by the refresh thread
+        with self.lock:
+            users = self.projects.get(project_key)
+        return users or self.fetch(jira, project_key)
+
+    def refresh(self, jira):
+        with self.lock:
+            projects = set(self.projects) | set(indexer.projects())
+        for project_key in projects:
+            self.fetch(jira, project_key)
+
+    def resolve(self, jira, project_key, mention, slack=None):
+        """The jira user a mention means, or None and the users it could mean."""
+        users = self.users(jira, project_key)
+        user, candidates = self.match(users, mention, slack)
+
+        # somebody new, maybe
+        if user is None and time.time() - users.refreshed > MISS_AGE:
+            user, candidates = self.match(self.fetch(jira, project_key), mention, slack)
+
+        return user, candidates
+
+    def match(self, users, mention, slack):
+        m = SLACK_MENTION.match(mention)
+        if m:
+            slack_user = slack and slack.get(m.group(1))
+            return (slack_user and users.from_slack(slack_user)), []
+
+        name = mention.lstrip('@')
+        user = users.by_name.get(name.lower())
+        if user:
+            return user, []
+
+        slack_user = slack and slack.find(name)
+        user = slack_user and users.from_slack(slack_user)
+        if user:
+            return user, []
+
+        candidates = users.find(name)
+        if len(candidates) == 1:
+            return candidates[0], []
+        return None, candidates
+
+    def translate(self, jira, project_key, text, slack=None):
+        # slack mentions in text become jira mentions
+        def mention(m):
+            user, _ = self.match(self.users(jira, project_key), m.group(0), slack)
+            if user:
+                return '[~{}]'.format(user['name'])
+            slack_user = slack and slack.get(m.group(1))
+            return '@' + slack_user.name if slack_user else m.group(0)
+
+        return SLACK_MENTION.sub(mention, text)
+
+
+def slack_users(server):
+    # worker processes have no slack connection, the reader sends the users a message mentions
+    slack = getattr(server, 'slack', None)
+    if slack:
+        return slack.server.users
+    return getattr(server, 'users', None)
+
+
+index = UserIndex()
+thread = None
+
+
+def start(pool, interval):
+    global thread
+
+    if thread:
+        return
+
+    def run():
+        while True:
+            try:
+                with pool.connection() as jira:
+                    index.refresh(jira)
+            except Exception:
+                logger.warning("assignable user refresh failed", exc_info=True)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='jira-users')
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,74 @@
+__author__ = 'natalie'
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    # Try for Python3
+    import queue
+except ImportError:
+    # Looks like Python2
+    import Queue as queue
+
+
+class Busy(Exception):
+    """Every client stayed checked out for as long as the caller would wait."""
+
+
+class Pool(object):
+    """Up to `size` jira clients, created on demand and shared by every
+    workspace and thread. A client is only used by one caller at a time."""
+
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.waits = 0
+
+    def acquire(self, timeout=None):
+        # clients inherited from a parent process share its sockets, start over
+        if self.pid != os.getpid():
+            self.reset()
+
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+            else:
+                self.waits += 1
+
+        if not create:
+            try:
+                return self.idle.get(timeout=timeout)
+            except queue.Empty:
+                raise Busy('no jira client free after {}s'.format(timeout))
+
+        try:
+            return self.connect()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def release(self, jira):
+        self.idle.put(jira)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        jira = self.acquire(timeout)
+        try:
+            yield jira
+        finally:
+            self.release(jira)
@@ -0,0 +1,242 @@
+__author__ = 'natalie'
+
+import base64
+import json
+import socket
+
+try:
+    # Try for Python3
+    import http.client as httplib
+    from urllib.parse import urlparse, urlencode
+except ImportError:
+    # Looks like Python2
+    import httplib
+    from urlparse import urlparse
+    from urllib import urlencode
+
+from jira.utils import JIRAError
+
+# what str() of a record shows, the same order the jira library uses
+READABLE = ('displayName', 'key', 'name', 'value', 'id')
+
+
+def wrap(value):
+    if isinstance(value, dict):
+        return Record(value)
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+
+def error_text(text):
+    # the messages in jira's error body, as the jira library reports them
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return text
+    if not isinstance(body, dict):
+        return text
+    messages = body.get('errorMessages', []) + list((body.get('errors') or {}).values())
+    return '\n'.join(messages) or text
+
+
+def key_of(issue):
+    # an Issue or its key
+    return getattr(issue, 'key', issue)
+
+
+class Record(object):
+    """Attribute access to a json object, nested objects are wrapped when they
+    are read. Stands in for the jira library's resources, without building
+    them all up front."""
+
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __getattr__(self, name):
+        try:
+            return wrap(self.raw[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name in self.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            self.raw[name] = value
+
+    def __str__(self):
+        for name in READABLE:
+            if name in self.raw:
+                return u'{}'.format(self.raw[name])
+        return repr(self.raw)
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self)
+
+
+class Issue(Record):
+    __slots__ = ('raw', 'client')
+
+    def __init__(self, raw, client):
+        Record.__init__(self, raw)
+        self.client = client
+
+    def update(self, fields=None, **fieldargs):
+        # like the jira library: fields wins over keyword fields, the issue is read again afterwards
+        if fields is None:
+            fields = {}
+            for name, value in fieldargs.items():
+                if name in ('assignee', 'reporter') and not isinstance(value, dict):
+                    value = {'name': value}
+                fields[name] = value
+
+        self.client.put('issue/{}'.format(self.key), {'fields': fields})
+        self.raw = self.client.get('issue/{}'.format(self.key))
+
+
+class Client(object):
+    """A small jira REST client covering what the commands use. It keeps one
+    HTTP/1.1 connection open between requests and is used by one thread at a
+    time: the Pool hands one to each command thread (command_threads of them,
+    or one per --workers process), so commands wait on jira side by side
+    while the event loop goes on reading slack."""
+
+    def __init__(self, server, user, password, timeout=30):
+        url = urlparse(server)
+        self.connection_class = httplib.HTTPSConnection if url.scheme == 'https' else httplib.HTTPConnection
+        self.host = url.netloc
+        self.base = url.path.rstrip('/') + '/rest/'
+        self.timeout = timeout
+        auth = base64.b64encode('{}:{}'.format(user, password).encode('utf-8')).decode('ascii')
+        self.headers = {
+            'Authorization': 'Basic ' + auth,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        }
+        self.conn = None
+        self.requests = 0
+        self.connects = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = self.connection_class(self.host, timeout=self.timeout)
+            self.connects += 1
+        return self.conn
+
+    def send(self, method, url, body):
+        reused = self.conn is not None
+        conn = self.connection()
+
+        try:
+            conn.request(method, url, body, self.headers)
+        except (httplib.HTTPException, socket.error):
+            self.close()
+            # jira may have closed an idle connection, nothing was sent, try a new one
+            if not reused:
+                raise
+            conn = self.connection()
+            conn.request(method, url, body, self.headers)
+
+        try:
+            response = conn.getresponse()
+            data = response.read()
+        except (httplib.HTTPException, socket.error):
+            self.close()
+            # a POST may have gone through, only read requests are safe to send again
+            if not reused or method == 'POST':
+                raise
+            conn = self.connection()
+            conn.request(method, url, body, self.headers)
+            response = conn.getresponse()
+            data = response.read()
+
+        if response.getheader('connection', '').lower() == 'close':
+            self.close()
+
+        return response.status, data
+
+    def request(self, method, path, params=None, data=None, api='api/2'):
+        url = self.base + api + '/' + path
+        if params:
+            url += '?' + urlencode(dict((k, v.encode('utf-8') if isinstance(v, type(u'')) else v)
+                                        for k, v in params.items()))
+        body = json.dumps(data) if data is not None else None
+
+        self.requests += 1
+        status, content = self.send(method, url, body)
+        text = content.decode('utf-8')
+
+        if status >= 400:
+            raise JIRAError(status, error_text(text), url)
+
+        return json.loads(text) if text else None
+
+    def get(self, path, params=None, api='api/2'):
+        return self.request('GET', path, params, api=api)
+
+    def post(self, path, data, api='api/2'):
+        return self.request('POST', path, data=data, api=api)
+
+    def put(self, path, data, api='api/2'):
+        return self.request('PUT', path, data=data, api=api)
+
+    # the jira library's names, so commands work with either client
+
+    def _get_json(self, path, params=None, base=None):
+        # base is one of the library's url templates, '{server}/rest/agile/1.0/{path}' and the like
+        api = base.split('/rest/', 1)[1].rsplit('/', 1)[0] if base else 'api/2'
+        return self.get(path, params, api=api)
+
+    def issue(self, key, fields=None):
+        return Issue(self.get('issue/{}'.format(key), fields and {'fields': fields}), self)
+
+    def search_issues(self, jql, startAt=0, maxResults=50, fields=None, json_result=False):
+        params = {'jql': jql, 'startAt': startAt, 'maxResults': maxResults}
+        if fields:
+            params['fields'] = fields
+        result = self.get('search', params)
+
+        if json_result:
+            return result
+        return [Issue(issue, self) for issue in result.get('issues', [])]
+
+    def transitions(self, issue):
+        return self.get('issue/{}/transitions'.format(key_of(issue)))['transitions']
+
+    def transition_issue(self, issue, transition, comment=None):
+        data = {'transition': {'id': transition}}
+        if comment:
+            data['update'] = {'comment': [{'add': {'body': comment}}]}
+        self.post('issue/{}/transitions'.format(key_of(issue)), data)
+
+    def create_issue(self, fields):
+        created = self.post('issue', {'fields': fields})
+        return self.issue(created['key'])
+
+    def assign_issue(self, issue, assignee):
+        self.put('issue/{}/assignee'.format(key_of(issue)), {'name': assignee})
+        return True
+
+    def add_comment(self, issue, body):
+        return Record(self.post('issue/{}/comment'.format(key_of(issue)), {'body': body}))
+
+    def projects(self):
+        return [Record(project) for project in self.get('project')]
+
+    def statuses(self):
+        return [Record(status) for status in self.get('status')]
+
+    def user(self, name):
+        return Record(self.get('user', {'username': name}))
+
+    def search_assignable_users_for_projects(self, username, projectKeys, startAt=0, maxResults=50):
+        params = {'username': username, 'projectKeys': projectKeys, 'startAt': startAt, 'maxResults': maxResults}
+        return [Record(user) for user in self.get('user/assignable/multiProjectSearch', params)]
@@ -1,6 +1,38 @@
 __author__ = 'natalie'
 
+import calendar
+import time
+
 from bot.config import config
+import cache
+
+
+# the shapes of `show issues/open/done/fires`, also used for counts and digests
+# finished, for statuses without a category
+DONE = ('Done', 'Closed', 'Resolved')
+
+QUERIES = {
+    'issues': 'project={}',
+    'open': 'project={} and status not in (' + ', '.join("'{}'".format(s) for s in DONE) + ')',
+    'done': 'project={} and status in (' + ', '.join("'{}'".format(s) for s in DONE) + ')',
+    'fires': 'project={} and labels in (fire)',
+}
+
+# jira only takes minutes in `updated >= -Nm`, so re-read a bit before the last
+# fetch and skip what was already seen
+OVERLAP = 60
+
+
+# for jira._get_json, the library's own AGILE_BASE_URL is the older greenhopper api
+AGILE_URL = '{server}/rest/agile/1.0/{path}'
+
+
+def project_query(kind, project_key):
+    return QUERIES[kind].format(project_key)
+
+
+def updated_since(since, now):
+    return 'updated >= -{}m'.format(int((now - since + OVERLAP) // 60) + 1)
 
 
 def error(message):
@@ -27,13 +59,84 @@ def get_transition(transitions, status):
     return None
 
 
+def projects(jira):
+    return cache.meta.fetch('projects', jira.projects)
+
+
+def statuses(jira):
+    return cache.meta.fetch('statuses', jira.statuses)
+
+
 def check_project(jira, project_key):
-    if project_key in [p.key for p in jira.projects()]:
+    if project_key in [p.key for p in projects(jira)]:
         return True
 
     return False
 
 
+def search_raw(jira, query, fields, page=100):
+    # raw issue dicts instead of Issue resources, fetched page by page
+    start = 0
+    while True:
+        result = jira.search_issues(query, startAt=start, maxResults=page, fields=fields, json_result=True)
+        issues = result.get('issues', [])
+
+        for issue in issues:
+            yield issue
+
+        start += len(issues)
+        if not issues or start >= result.get('total', 0):
+            return
+
+
+def count(jira, query):
+    # search_issues turns maxResults=0 into "fetch them all", ask for the total only
+    return jira._get_json('search', params={'jql': query, 'maxResults': 0, 'fields': 'key'})['total']
+
+
+def agile_pages(jira, path, params=None, key='values', page=50):
+    # the agile api pages with isLast (boards, sprints) or total (issues)
+    start = 0
+    while True:
+        query = dict(params or {}, startAt=start, maxResults=page)
+        result = jira._get_json(path, params=query, base=AGILE_URL)
+        items = result.get(key, [])
+
+        for item in items:
+            yield item
+
+        start += len(items)
+        if not items or result.get('isLast') or start >= result.get('total', start + 1):
+            return
+
+
+def group_by(jira, query, fields, *keys):
+    # one {key(issue fields): number of issues} per key, in a single scan fetching only `fields`
+    groups = [{} for _ in keys]
+    for issue in search_raw(jira, query, fields, page=500):
+        for key, counts in zip(keys, groups):
+            group = key(issue['fields'])
+            counts[group] = counts.get(group, 0) + 1
+    return groups
+
+
+def parse_time(value):
+    # '2015-06-01T12:34:56.000+0300' or '...000Z' -> unix time
+    seconds = calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+    if value.endswith('Z'):
+        return seconds
+
+    offset = int(value[-4:-2]) * 3600 + int(value[-2:]) * 60
+    if value[-5] == '-':
+        offset = -offset
+
+    return seconds - offset
+
+
+def issue_link(issue_key):
+    return '{}/browse/{}'.format(config.get('jira_server'), issue_key)
+
+
 def project_info(project):
     return '{}: {}'.format(project.key, project.name)
 
@@ -45,7 +148,7 @@ def issue_info(issue):
     issue_labels = ','.join(issue.fields.labels or ['no labels', ])
     issue_type = issue.fields.issuetype
     issue_status = issue.fields.status
-    issue_link = '{}/browse/{}'.format(config.get('jira_server'), issue_key)
+    link = issue_link(issue_key)
 
     assignee = issue.fields.assignee
 
@@ -61,7 +164,7 @@ def issue_info(issue):
                                            issue_type,
                                            issue_status,
                                            assignee,
-                                           issue_link)
+                                           link)
 
 
 def user_info(user):
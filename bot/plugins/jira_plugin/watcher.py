@@ -0,0 +1,266 @@
+__author__ = 'natalie'
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from bot.config import config
+from bot.locks import file_lock
+import utils
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('all', 'new', 'status', 'fires')
+FIELDS = 'summary,status,labels,created,updated'
+
+
+class Watches(object):
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # {'team': ..., 'channel': ..., 'project': ..., 'kind': ...}
+        self.watches = []
+        # project -> unix time of the last poll
+        self.watermarks = {}
+        # issue key -> (updated, status, labels) as it was last seen
+        self.seen = {}
+        self.primed = set()
+        self.mtime = None
+        self.load()
+
+    def load(self, force=False):
+        # worker processes add watches too, pick up what they saved
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        mtime = os.path.getmtime(self.path)
+        if mtime == self.mtime and not force:
+            return
+
+        with open(self.path) as f:
+            data = json.load(f)
+
+        with self.lock:
+            self.mtime = mtime
+            self.watches = data.get('watches', [])
+            for project, watermark in data.get('watermarks', {}).items():
+                self.watermarks[project] = max(watermark, self.watermarks.get(project, 0))
+
+    def save(self):
+        if not self.path:
+            return
+
+        with self.lock:
+            data = json.dumps({'watches': self.watches, 'watermarks': self.watermarks})
+
+        tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.rename(tmp, self.path)
+        self.mtime = os.path.getmtime(self.path)
+
+    @contextmanager
+    def updating(self):
+        # load, change and save without another process saving in between
+        if not self.path:
+            yield
+            return
+
+        with file_lock(self.path):
+            self.load(force=True)
+            yield
+            self.save()
+
+    def add(self, team, channel, project, kind):
+        watch = {'team': team, 'channel': channel, 'project': project, 'kind': kind}
+
+        with self.updating():
+            with self.lock:
+                if watch in self.watches:
+                    return False
+                self.watches.append(watch)
+        return True
+
+    def remove(self, team, channel, project, kind=None):
+        with self.updating():
+            with self.lock:
+                keep = [w for w in self.watches
+                        if not (w.get('team') == team and w['channel'] == channel and
+                                w['project'] == project and kind in (None, w['kind']))]
+                removed = len(self.watches) - len(keep)
+                self.watches = keep
+        return removed
+
+    def channel_watches(self, team, channel):
+        self.load()
+        with self.lock:
+            return [w for w in self.watches if w.get('team') == team and w['channel'] == channel]
+
+    def subscribers(self):
+        # project -> {(team, channel): set of kinds}
+        projects = {}
+        self.load()
+        with self.lock:
+            for w in self.watches:
+                target = (w.get('team'), w['channel'])
+                projects.setdefault(w['project'], {}).setdefault(target, set()).add(w['kind'])
+        return projects
+
+    def remember(self, issue):
+        fields = issue['fields']
+        status = (fields.get('status') or {}).get('name')
+        self.seen[issue['key']] = (fields.get('updated'), status, tuple(fields.get('labels') or ()))
+
+    def changes(self, issue, since):
+        # kinds of change since the issue was last seen, and its old status
+        fields = issue['fields']
+        status = (fields.get('status') or {}).get('name')
+        labels = fields.get('labels') or ()
+        old = self.seen.get(issue['key'])
+        self.remember(issue)
+
+        kinds = []
+        if old is None:
+            if fields.get('created') and utils.parse_time(fields['created']) >= since:
+                kinds.append('new')
+                if 'fire' in labels:
+                    kinds.append('fires')
+            elif status not in utils.DONE:
+                # only open issues are primed, so this one got reopened
+                kinds.append('status')
+            return kinds, None
+
+        if old[0] == fields.get('updated'):
+            return kinds, old[1]
+
+        if old[1] != status:
+            kinds.append('status')
+        if 'fire' in labels and 'fire' not in old[2]:
+            kinds.append('fires')
+
+        return kinds, old[1]
+
+    def prime(self, jira, project):
+        for issue in utils.search_raw(jira, utils.project_query('open', project), FIELDS):
+            self.remember(issue)
+        self.primed.add(project)
+
+    def poll(self, jira, post):
+        # one query per project however many channels watch it
+        for project, subscribers in self.subscribers().items():
+            started = time.time()
+            since = self.watermarks.get(project)
+
+            if project not in self.primed:
+                self.prime(jira, project)
+
+            if since is None:
+                self.watermarks[project] = started
+                continue
+
+            query = 'project={} and {} order by updated asc'.format(project, utils.updated_since(since, started))
+
+            messages = {}
+            for issue in utils.search_raw(jira, query, FIELDS):
+                kinds, old_status = self.changes(issue, since)
+                if kinds:
+                    route(subscribers, issue, kinds, old_status, messages)
+
+            self.watermarks[project] = started
+
+            for (team, channel), texts in messages.items():
+                post(team, channel, '\n'.join(texts))
+
+        # keep watches added meanwhile by other processes
+        with self.updating():
+            pass
+
+    def apply(self, event, payload, post):
+        # a pushed webhook event, the changelog says what changed
+        issue = payload.get('issue')
+        if not issue:
+            return
+
+        if event == 'jira:issue_deleted':
+            self.seen.pop(issue['key'], None)
+            return
+
+        kinds, old_status = pushed_changes(event, payload)
+        self.remember(issue)
+
+        subscribers = self.subscribers().get(issue['key'].split('-')[0])
+        if not kinds or not subscribers:
+            return
+
+        messages = {}
+        route(subscribers, issue, kinds, old_status, messages)
+        for (team, channel), texts in messages.items():
+            post(team, channel, '\n'.join(texts))
+
+
+def pushed_changes(event, payload):
+    labels = payload['issue']['fields'].get('labels') or ()
+
+    if event == 'jira:issue_created':
+        return ['new', 'fires'] if 'fire' in labels else ['new'], None
+
+    kinds = []
+    old_status = None
+    for item in (payload.get('changelog') or {}).get('items', []):
+        if item.get('field') == 'status':
+            kinds.append('status')
+            old_status = item.get('fromString')
+        elif item.get('field') == 'labels':
+            if 'fire' in (item.get('toString') or '').split() and 'fire' not in (item.get('fromString') or '').split():
+                kinds.append('fires')
+
+    return kinds, old_status
+
+
+def route(subscribers, issue, kinds, old_status, messages):
+    text = describe(issue, kinds, old_status)
+    for target, wanted in subscribers.items():
+        if 'all' in wanted or wanted.intersection(kinds):
+            messages.setdefault(target, []).append(text)
+
+
+def describe(issue, kinds, old_status):
+    fields = issue['fields']
+    status = (fields.get('status') or {}).get('name')
+
+    if 'new' in kinds:
+        change = 'new'
+    elif 'status' in kinds:
+        change = '{} -> {}'.format(old_status or '?', status)
+    else:
+        change = 'on fire'
+
+    return '{}: {} {} [{}] {}'.format(change, issue['key'], fields.get('summary'), status,
+                                      utils.issue_link(issue['key']))
+
+
+watches = Watches(config.get('jira_watch_file'))
+thread = None
+
+
+def start(pool, post, interval):
+    global thread
+
+    if thread:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with pool.connection() as jira:
+                    watches.poll(jira, post)
+            except Exception:
+                logger.warning("watch poll failed", exc_info=True)
+
+    thread = threading.Thread(target=run, name='jira-watch')
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,101 @@
+__author__ = 'natalie'
+
+import json
+import logging
+import threading
+
+try:
+    # Try for Python3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import urlparse, parse_qs
+    import queue
+except ImportError:
+    # Looks like Python2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urlparse import urlparse, parse_qs
+    import Queue as queue
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+# callables taking (webhook event name, payload dict)
+listeners = []
+
+# raw request bodies, parsed and routed by the dispatcher thread
+payloads = queue.Queue(1000)
+
+stats = {'received': 0, 'rejected': 0, 'dropped': 0, 'failed': 0}
+
+
+def subscribe(listener):
+    listeners.append(listener)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    # answer right away, everything else happens on the dispatcher thread
+    def do_POST(self):
+        secret = config.get('jira_webhook_secret')
+        if secret and parse_qs(urlparse(self.path).query).get('secret') != [secret]:
+            stats['rejected'] += 1
+            self.send_response(403)
+            self.end_headers()
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        try:
+            payloads.put_nowait(body)
+            stats['received'] += 1
+            self.send_response(204)
+        except queue.Full:
+            stats['dropped'] += 1
+            self.send_response(503)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def dispatch(body):
+    payload = json.loads(body.decode('utf-8'))
+    if not isinstance(payload, dict):
+        raise ValueError('not a json object')
+    event = payload.get('webhookEvent', '')
+
+    for listener in listeners:
+        try:
+            listener(event, payload)
+        except Exception:
+            stats['failed'] += 1
+            logger.warning("webhook listener %s failed on %s", listener, event, exc_info=True)
+
+
+def route():
+    while True:
+        body = payloads.get()
+        try:
+            dispatch(body)
+        except ValueError:
+            stats['failed'] += 1
+            logger.warning("webhook payload is not a json object: %r", body[:200])
+        except Exception:
+            # whatever it was, the next payload still gets routed
+            stats['failed'] += 1
+            logger.warning("webhook payload failed: %r", body[:200], exc_info=True)
+
+
+def start(port, host='127.0.0.1'):
+    # anybody who can reach the listener can post to it
+    if not config.get('jira_webhook_secret') and host not in ('127.0.0.1', 'localhost', '::1'):
+        raise Exception('Set jira_webhook_secret to listen for jira webhooks on {}'.format(host or 'all interfaces'))
+
+    server = HTTPServer((host, port), WebhookHandler)
+
+    for target, name in ((server.serve_forever, 'jira-webhook'), (route, 'jira-webhook-router')):
+        thread = threading.Thread(target=target, name=name)
+        thread.daemon = True
+        thread.start()
+
+    logger.info("listening for jira webhooks on %s:%s", host, port)
+    return server
@@ -0,0 +1,164 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+# types in the memory report
+TOP = 25
+
+# Python 2 instances of old-style classes all have this type
+InstanceType = getattr(types, "InstanceType", None)
+
+
+def object_counts():
+    # objects the garbage collector tracks, by type: [count, bytes of the objects themselves]
+    counts = {}
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls is InstanceType:
+            cls = obj.__class__
+        name = "{}.{}".format(cls.__module__, cls.__name__)
+        entry = counts.get(name)
+        if entry is None:
+            entry = counts[name] = [0, 0]
+        entry[0] += 1
+        entry[1] += sys.getsizeof(obj, 0)
+    return counts
+
+
+class SamplingProfiler(object):
+    """Samples the stack of every thread `interval` seconds apart.
+
+    Blocked threads are sampled too, so waiting on slack, jira or a queue
+    shows up as well as running code. The counts are written as collapsed
+    stacks, one `thread;outer;...;inner count` line each, which flamegraph.pl
+    and speedscope read as they are.
+    """
+
+    def __init__(self, interval=0.01, memory=False):
+        self.interval = interval
+        self.memory = memory
+        # collapsed stack -> samples
+        self.stacks = {}
+        self.samples = 0
+        # code object -> its label, to keep the sampling cheap
+        self.labels = {}
+        self.running = False
+        self.thread = None
+        self.started = None
+        # object counts by type when profiling started
+        self.objects = None
+
+    def start(self):
+        if self.memory:
+            self.objects = object_counts()
+
+        self.running = True
+        self.started = time.time()
+        self.thread = threading.Thread(target=self.run, name="bot-profiler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def run(self):
+        me = threading.current_thread().ident
+        while self.running:
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.sample(names.get(ident, str(ident)), frame)
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def sample(self, thread, frame):
+        stack = []
+        labels = self.labels
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename),
+                                                          code.co_firstlineno)
+            stack.append(label)
+            frame = frame.f_back
+
+        stack.append(thread)
+        key = ";".join(reversed(stack))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def write(self, directory):
+        # files named after the time profiling started, returns their paths
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        prefix = os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S", time.localtime(self.started)))
+
+        paths = [prefix + ".folded"]
+        with open(paths[0], "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write("{} {}\n".format(stack, count))
+
+        if self.objects is not None:
+            paths.append(prefix + ".objects.txt")
+            with open(paths[1], "w") as f:
+                self.write_objects(f)
+
+        return paths
+
+    def write_objects(self, f):
+        now = object_counts()
+        line = "{:>10} {:>12}  {}\n"
+
+        f.write("objects the garbage collector tracks, so no strings or numbers\n\n")
+
+        grown = [(count - self.objects.get(name, [0, 0])[0], size - self.objects.get(name, [0, 0])[1], name)
+                 for name, (count, size) in now.items()]
+        f.write("grown since profiling started:\n")
+        f.write(line.format("objects", "bytes", "type"))
+        for count, size, name in sorted(grown, reverse=True)[:TOP]:
+            if count > 0:
+                f.write(line.format("+{}".format(count), "{:+d}".format(size), name))
+
+        f.write("\nmost objects now:\n")
+        f.write(line.format("objects", "bytes", "type"))
+        for name, (count, size) in sorted(now.items(), key=lambda item: item[1], reverse=True)[:TOP]:
+            f.write(line.format(count, size, name))
+
+
+# the one running in this process, if any
+current = None
+lock = threading.Lock()
+
+
+def start(interval=0.01, memory=False):
+    global current
+
+    with lock:
+        if current:
+            raise RuntimeError("already profiling since {}".format(time.ctime(current.started)))
+        profiler = SamplingProfiler(interval, memory)
+        profiler.start()
+        current = profiler
+
+    logger.info("profiling every %ss%s", interval, " with object counts" if memory else "")
+
+
+def stop(directory):
+    global current
+
+    with lock:
+        if not current:
+            raise RuntimeError("not profiling")
+        profiler, current = current, None
+
+    profiler.stop()
+    paths = profiler.write(directory)
+    logger.info("profile of %s samples written to %s", profiler.samples, ", ".join(paths))
+    return paths
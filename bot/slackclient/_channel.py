@@ -1,9 +1,14 @@
+from ._util import compact
+
+
 class Channel(object):
-    def __init__(self, server, name, id, members=[]):
+    __slots__ = ("server", "name", "id", "members")
+
+    def __init__(self, server, name, id, members=None):
         self.server = server
         self.name = name
         self.id = id
-        self.members = members
+        self.members = compact(members or ())
 
     def __eq__(self, compare_str):
         if self.name == compare_str or self.name == "#" + compare_str or self.id == compare_str:
@@ -13,8 +18,8 @@ class Channel(object):
 
     def __str__(self):
         data = ""
-        for key in list(self.__dict__.keys()):
-            data += "{} : {}\n".format(key, str(self.__dict__[key])[:40])
+        for key in self.__slots__:
+            data += "{} : {}\n".format(key, str(getattr(self, key))[:40])
         return data
 
     def __repr__(self):
@@ -2,14 +2,27 @@
 # mostly a proxy object to abstract how some of this works
 
 import json
+import re
 
 from ._server import Server
 
 
+# events the client keeps state for itself, see process_changes
+STATE_EVENTS = ('channel_created', 'channel_rename', 'channel_deleted', 'group_joined', 'group_rename',
+                'group_left', 'im_created', 'im_close', 'team_join', 'user_change')
+
+# slack puts "type" first in RTM events, so it can be peeked at without
+# decoding the whole frame
+EVENT_TYPE = re.compile(r'\s*\{\s*"type"\s*:\s*"([^"\\]*)"')
+
+
 class SlackClient(object):
-    def __init__(self, token):
+    def __init__(self, token, im_cache_size=200):
         self.token = token
-        self.server = Server(self.token, False)
+        self.server = Server(self.token, False, im_cache_size)
+        # None means every frame gets decoded
+        self.event_types = None
+        self.skipped = 0
 
     def rtm_connect(self):
         try:
@@ -21,6 +34,13 @@ class SlackClient(object):
     def api_call(self, method, **kwargs):
         return self.server.api_call(method, **kwargs)
 
+    def subscribe(self, *event_types):
+        """Only decode frames of these event types (and STATE_EVENTS) from now
+        on. Frames whose type can't be peeked at are always decoded."""
+        if self.event_types is None:
+            self.event_types = set(STATE_EVENTS)
+        self.event_types.update(event_types)
+
     def rtm_read(self):
         # in the future, this should handle some events internally i.e. channel
         # creation
@@ -29,25 +49,40 @@ class SlackClient(object):
             data = []
             if json_data != '':
                 for d in json_data.split('\n'):
-                    data.append(json.loads(d))
+                    if self.wants(d):
+                        data.append(json.loads(d))
             for item in data:
                 self.process_changes(item)
             return data
         else:
             raise SlackNotConnected
 
+    def wants(self, frame):
+        if self.event_types is None:
+            return True
+
+        m = EVENT_TYPE.match(frame)
+        if m and m.group(1) not in self.event_types:
+            self.skipped += 1
+            return False
+
+        return True
+
     def rtm_send_message(self, channel, message):
         return self.server.channels.find(channel).send_message(message)
 
     def process_changes(self, data):
         if "type" in data.keys():
-            if data["type"] == 'channel_created':
+            if data["type"] in ('channel_created', 'channel_rename', 'group_joined', 'group_rename'):
                 channel = data["channel"]
-                self.server.attach_channel(channel["name"], channel["id"], [])
+                self.server.attach_channel(channel["name"], channel["id"], channel.get("members"))
             if data["type"] == 'im_created':
                 channel = data["channel"]
-                self.server.attach_channel(channel["user"], channel["id"], [])
-            pass
+                self.server.attach_channel(channel["user"], channel["id"])
+            if data["type"] in ('channel_deleted', 'group_left', 'im_close'):
+                self.server.channels.remove(data["channel"])
+            if data["type"] in ('team_join', 'user_change'):
+                self.server.parse_user_data([data["user"]])
 
 
 class SlackNotConnected(Exception):
@@ -1,21 +1,26 @@
 from ._slackrequest import SlackRequest
 from ._channel import Channel
 from ._user import User
-from ._util import SearchList
+from ._util import EntityStore
 
 from websocket import create_connection
 import json
 
 
+def is_im(channel):
+    return channel.id.startswith("D")
+
+
 class Server(object):
-    def __init__(self, token, connect=True):
+    def __init__(self, token, connect=True, im_cache_size=200):
         self.token = token
         self.username = None
         self.domain = None
         self.login_data = None
         self.websocket = None
-        self.users = SearchList()
-        self.channels = SearchList()
+        self.users = EntityStore()
+        # IMs are many and rarely used, keep the recent ones and reload others
+        self.channels = EntityStore(evictable=is_im, size=im_cache_size, load=self.load_channel)
         self.connected = False
         self.pingcounter = 0
         self.api_requester = SlackRequest()
@@ -110,10 +115,23 @@ class Server(object):
                 return data.rstrip()
 
     def attach_user(self, name, id, real_name, tz):
-        self.users.append(User(self, name, id, real_name, tz))
-
-    def attach_channel(self, name, id, members=[]):
-        self.channels.append(Channel(self, name, id, members))
+        return self.users.upsert(User(self, name, id, real_name, tz))
+
+    def attach_channel(self, name, id, members=None):
+        # renames and the like don't come with members, keep the ones we have
+        if members is None:
+            old = self.channels.get(id)
+            members = old.members if old else ()
+        return self.channels.upsert(Channel(self, name, id, members))
+
+    def load_channel(self, id):
+        reply = json.loads(self.api_call("conversations.info", channel=id).decode('utf-8'))
+        if not reply.get("ok"):
+            return None
+
+        channel = reply["channel"]
+        name = channel.get("name") or channel.get("user") or channel["id"]
+        return self.attach_channel(name, channel["id"], channel.get("members"))
 
     def join_channel(self, name):
         print(self.api_requester.do(self.token,
@@ -1,4 +1,6 @@
 class User(object):
+    __slots__ = ("tz", "name", "real_name", "server", "id")
+
     def __init__(self, server, name, id, real_name, tz):
         self.tz = tz
         self.name = name
@@ -14,9 +16,9 @@ class User(object):
 
     def __str__(self):
         data = ""
-        for key in list(self.__dict__.keys()):
+        for key in self.__slots__:
             if key != "server":
-                data += "{} : {}\n".format(key, str(self.__dict__[key])[:40])
+                data += "{} : {}\n".format(key, str(getattr(self, key))[:40])
         return data
 
     def __repr__(self):
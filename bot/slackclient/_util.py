@@ -1,16 +1,88 @@
-class SearchList(list):
+import re
+from collections import OrderedDict
+
+try:
+    # Try for Python3
+    from sys import intern
+except ImportError:
+    # Looks like Python2, where it's a builtin
+    pass
+
+# what slack ids look like, as opposed to names
+ID = re.compile(r'^[CDGUW][A-Z0-9]{2,}$')
+
+
+def compact(ids):
+    # member lists repeat the same few thousand user ids across channels
+    return tuple(intern(str(id)) for id in ids)
+
+
+class EntityStore(object):
+    """Users or channels by id, found by id or name.
+
+    Entities `evictable` says can be fetched again (IMs) are kept in an LRU of
+    at most `size`, `load(id)` brings one back when it's asked for.
+    """
+
+    def __init__(self, evictable=None, size=None, load=None):
+        self.entities = {}
+        self.recent = OrderedDict()
+        self.names = {}
+        self.evictable = evictable
+        self.size = size
+        self.load = load
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entities) + len(self.recent)
+
+    def __iter__(self):
+        for entity in list(self.entities.values()) + list(self.recent.values()):
+            yield entity
+
+    def get(self, id):
+        entity = self.entities.get(id)
+        if entity is None:
+            entity = self.recent.pop(id, None)
+            if entity is not None:
+                # most recently used goes last
+                self.recent[id] = entity
+        return entity
+
+    def upsert(self, entity):
+        old = self.get(entity.id)
+        if old is not None and old.name != entity.name and self.names.get(old.name) == old.id:
+            del self.names[old.name]
+
+        self.names[entity.name] = entity.id
+
+        if self.evictable and self.evictable(entity):
+            self.recent.pop(entity.id, None)
+            self.recent[entity.id] = entity
+            while self.size is not None and len(self.recent) > self.size:
+                _, evicted = self.recent.popitem(last=False)
+                if self.names.get(evicted.name) == evicted.id:
+                    del self.names[evicted.name]
+                self.evictions += 1
+        else:
+            self.entities[entity.id] = entity
+
+        return entity
+
+    def append(self, entity):
+        self.upsert(entity)
+
+    def remove(self, id):
+        entity = self.entities.pop(id, None) or self.recent.pop(id, None)
+        if entity is not None and self.names.get(entity.name) == id:
+            del self.names[entity.name]
+        return entity
 
     def find(self, name):
-        items = []
-        for child in self:
-            if child.__class__ == self.__class__:
-                items += child.find(name)
-            else:
-                if child == name:
-                    items.append(child)
-
-        if len(items) == 1:
-            return items[0]
-        elif items:
-            return items
+        if name is None:
+            return None
 
+        entity = self.get(self.names.get(name) or self.names.get(name.lstrip('#')) or name)
+        if entity is None and self.load and ID.match(name):
+            entity = self.load(name)
+        return entity
@@ -0,0 +1,365 @@
+import logging
+import os
+import pickle
+import re
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    # Try for Python3
+    import queue
+except ImportError:
+    # Looks like Python2
+    import Queue as queue
+
+from .bot import init_log, init_plugins, run_hook
+from .config import config as settings
+from .slackclient._user import User
+from .slackclient._util import EntityStore
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = 5
+
+# the directory holding the bot package, for the worker interpreters
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# <@U123> or <@U123|name> as slack sends a mention, or @name as typed
+MENTIONS = re.compile(r'<@(\w+)(?:\|[^>]*)?>|@([\w.\-]+)')
+
+
+class Channel(object):
+    """Pickles sent down a pipe, by any thread."""
+
+    def __init__(self, f):
+        self.f = f
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        with self.lock:
+            try:
+                pickle.dump(item, self.f, pickle.HIGHEST_PROTOCOL)
+                self.f.flush()
+            except (IOError, OSError):
+                # the other side is gone, the reader restarts dead workers
+                pass
+
+
+def receive(f, items):
+    # pickles from a pipe into a queue, None once the other side is gone
+    while True:
+        try:
+            item = pickle.load(f)
+        except (EOFError, IOError, OSError):
+            items.put(None)
+            return
+        items.put(item)
+
+
+def mentioned_users(server, text):
+    # (id, name, real name) of the users a message mentions, looked up by the reader
+    users = server.slack.server.users
+    found = {}
+    for user_id, name in MENTIONS.findall(text or ""):
+        user = users.get(user_id) if user_id else users.find(name)
+        if user is not None:
+            found[user.id] = (user.id, user.name, user.real_name)
+    return list(found.values())
+
+
+class WorkerServer(object):
+    """Stands in for the bot Server inside a worker process. There is no
+    slack connection here, posts are sent back to the reader, and the only
+    slack users known are the ones the message mentions."""
+
+    def __init__(self, config, hooks, team, replies, mentioned=()):
+        self.config = config
+        self.hooks = hooks
+        self.team = team
+        self.replies = replies
+        self.users = EntityStore()
+        for user_id, name, real_name in mentioned:
+            self.users.upsert(User(None, name, user_id, real_name, None))
+
+    def post(self, channel, message):
+        self.replies.put(("post", self.team, channel, message))
+
+
+def work(index, pluginpath, config, tasks, replies):
+    init_log(config)
+    serve(index, init_plugins(pluginpath), config, tasks, replies)
+
+
+def serve(index, hooks, config, tasks, replies):
+    while True:
+        try:
+            task = tasks.get(timeout=HEARTBEAT)
+        except queue.Empty:
+            replies.put(("heartbeat", index))
+            continue
+
+        if task is None:
+            return
+
+        seq, team, channel, event, mentioned = task
+        server = WorkerServer(config, hooks, team, replies, mentioned)
+
+        response = '\n'.join(run_hook(hooks, "message", event, server))
+        replies.put(("reply", index, team, channel, seq, response))
+
+
+def main():
+    # tasks come in on stdin and replies go out on what was stdout, anything
+    # a plugin prints goes to stderr instead of into the replies
+    tasks = os.fdopen(os.dup(0), "rb")
+    replies = Channel(os.fdopen(os.dup(1), "wb"))
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    index, pluginpath, config = pickle.load(tasks)
+    settings.update(config, worker=index)
+
+    queued = queue.Queue()
+    thread = threading.Thread(target=receive, args=(tasks, queued), name="bot-worker-tasks")
+    thread.daemon = True
+    thread.start()
+
+    work(index, pluginpath, settings, queued, replies)
+
+
+class Worker(object):
+    """A worker process and its own pipes, so one dying can't leave anything
+    locked for the others. It's a new interpreter rather than a fork of the
+    reader: a restarted worker would inherit whatever locks the reader's
+    threads held at the time."""
+
+    def __init__(self, index, pluginpath, config):
+        self.heartbeat = time.time()
+        # (team, channel, seq) handed to this worker and not answered yet
+        self.pending = set()
+        self.replies = queue.Queue()
+
+        path = [ROOT]
+        if os.environ.get("PYTHONPATH"):
+            path.append(os.environ["PYTHONPATH"])
+        self.proc = subprocess.Popen([sys.executable, "-c", "from bot.workers import main; main()"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True,
+                                     env=dict(os.environ, PYTHONPATH=os.pathsep.join(path)))
+        self.tasks = Channel(self.proc.stdin)
+        self.tasks.put((index, pluginpath, config))
+
+        thread = threading.Thread(target=receive, args=(self.proc.stdout, self.replies),
+                                  name="bot-worker-{}".format(index))
+        thread.daemon = True
+        thread.start()
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def returncode(self):
+        return self.proc.returncode
+
+    def terminate(self):
+        self.proc.terminate()
+
+
+class ThreadWorker(object):
+    """A worker thread in the reader process, running the reader's own hooks
+    and so its indexer, caches and jira pool. Commands wait on jira side by
+    side, each with its own client, while the event loop goes on reading."""
+
+    def __init__(self, index, hooks, config):
+        self.heartbeat = time.time()
+        # (team, channel, seq) handed to this worker and not answered yet
+        self.pending = set()
+        self.tasks = queue.Queue()
+        self.replies = queue.Queue()
+
+        self.thread = threading.Thread(target=serve, args=(index, hooks, config, self.tasks, self.replies),
+                                       name="bot-command-{}".format(index))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def alive(self):
+        return self.thread.is_alive()
+
+    def returncode(self):
+        return None
+
+    def terminate(self):
+        # a thread can't be stopped, it's a daemon and ends with the process
+        pass
+
+
+class WorkerPool(object):
+    """Runs message hooks in `count` worker processes, or with `hooks` in
+    `count` threads of the reader. Replies are sent by the reader in the
+    order the messages came in, per channel."""
+
+    def __init__(self, count, pluginpath, config, hooks=None):
+        self.count = count
+        self.pluginpath = pluginpath
+        self.config = config
+        self.hooks = hooks
+        self.timeout = config.get("worker_timeout") or 60
+        self.workers = []
+        # (team, channel) -> next seq to hand out / next seq to send
+        self.next_seq = {}
+        self.expected = {}
+        # (team, channel) -> {seq: response}, replies that came in early
+        self.held = {}
+        # (team, channel, seq) -> time it was submitted
+        self.submitted = {}
+        # (team, channel, seq) -> called once it's answered, timed out or lost
+        self.callbacks = {}
+        # channels with messages in flight
+        self.waiting = set()
+        # (team, channel, seq) timed out and still with a worker, sent whenever it's answered
+        self.late = set()
+        self.stats = {"submitted": 0, "replied": 0, "timeouts": 0, "late": 0, "lost": 0, "restarts": 0}
+
+    def start(self):
+        self.workers = [self.spawn(index) for index in range(self.count)]
+
+    def spawn(self, index):
+        if self.hooks is not None:
+            return ThreadWorker(index, self.hooks, self.config)
+        return Worker(index, self.pluginpath, self.config)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.tasks.put(None)
+
+        deadline = time.time() + self.timeout
+        for worker in self.workers:
+            while worker.alive() and time.time() < deadline:
+                time.sleep(0.1)
+            if worker.alive():
+                worker.terminate()
+
+    def submit(self, server, event, done=None):
+        key = (server.team, event["channel"])
+        seq = self.next_seq.get(key, 0)
+        self.next_seq[key] = seq + 1
+        self.expected.setdefault(key, seq)
+        self.submitted[key + (seq,)] = time.time()
+        if done:
+            self.callbacks[key + (seq,)] = done
+        self.waiting.add(key)
+
+        worker = min(self.workers, key=lambda w: len(w.pending))
+        worker.pending.add(key + (seq,))
+        worker.tasks.put((seq, server.team, event["channel"], event, mentioned_users(server, event.get("text"))))
+        self.stats["submitted"] += 1
+
+    def collect(self, servers):
+        # send whatever came back from the workers, called from the event loop
+        teams = dict((server.team, server) for server in servers)
+
+        for worker in self.workers:
+            self.receive(worker, teams)
+
+        now = time.time()
+        for key in list(self.waiting):
+            self.flush(key, teams.get(key[0]), now)
+
+        self.check()
+
+    def receive(self, worker, teams):
+        while True:
+            try:
+                reply = worker.replies.get_nowait()
+            except queue.Empty:
+                return
+
+            # the worker is gone, check() restarts it
+            if reply is None:
+                return
+
+            worker.heartbeat = time.time()
+
+            if reply[0] == "post":
+                _, team, channel, message = reply
+                if team in teams:
+                    teams[team].post(channel, message)
+            elif reply[0] == "reply":
+                _, index, team, channel, seq, response = reply
+                worker.pending.discard((team, channel, seq))
+                self.stats["replied"] += 1
+                if (team, channel, seq) in self.late:
+                    # the channel was told it timed out, send it now rather than in order
+                    self.late.discard((team, channel, seq))
+                    self.stats["late"] += 1
+                    self.send(teams.get(team), channel, response)
+                elif (team, channel, seq) in self.submitted:
+                    self.held.setdefault((team, channel), {})[seq] = response
+
+    def flush(self, key, server, now):
+        held = self.held.get(key, {})
+        seq = self.expected[key]
+
+        while seq < self.next_seq[key]:
+            submitted = self.submitted.pop(key + (seq,), None)
+
+            if seq in held:
+                self.finish(key + (seq,))
+                self.send(server, key[1], held.pop(seq))
+            elif submitted and now - submitted <= self.timeout:
+                self.submitted[key + (seq,)] = submitted
+                break
+            elif submitted:
+                # still stuck, don't hold the channel up
+                self.finish(key + (seq,))
+                self.stats["timeouts"] += 1
+                self.late.add(key + (seq,))
+                logger.warning("no reply for message %s in %s after %ss", seq, key, self.timeout)
+                self.send(server, key[1], "That's taking longer than {}s, I'll post the answer here when it's done"
+                          .format(self.timeout))
+
+            seq += 1
+
+        self.expected[key] = seq
+        if seq == self.next_seq[key]:
+            self.waiting.discard(key)
+            self.held.pop(key, None)
+
+    def send(self, server, channel, response):
+        if response and server:
+            server.metrics["responses"] += 1
+            server.slack.rtm_send_message(channel, response)
+
+    def finish(self, task):
+        done = self.callbacks.pop(task, None)
+        if done:
+            done()
+
+    def check(self):
+        for index, worker in enumerate(self.workers):
+            if worker.alive():
+                continue
+
+            logger.warning("worker %s exited with %s, restarting", index, worker.returncode())
+            self.stats["restarts"] += 1
+
+            # whatever it was working on is gone with it
+            self.stats["lost"] += len(worker.pending)
+            for task in worker.pending:
+                self.late.discard(task)
+                if self.submitted.pop(task, None):
+                    self.finish(task)
+
+            self.workers[index] = self.spawn(index)
+
+    def depth(self):
+        # handed to a worker and not answered yet
+        return sum(len(worker.pending) for worker in self.workers)
+
+    def health(self):
+        now = time.time()
+        return dict(self.stats,
+                    depth=self.depth(),
+                    in_flight=len(self.submitted),
+                    alive=sum(1 for worker in self.workers if worker.alive()),
+                    heartbeat_age=[int(now - worker.heartbeat) for worker in self.workers])
@@ -0,0 +1,49 @@
+import os
+import unittest
+
+# no slack or jira settings needed to import the bot package
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.admission import Admission
+
+CONFIG = {'user_rate': 0.001, 'user_burst': 2, 'channel_rate': 0.001, 'channel_burst': 3,
+          'expensive_commands': ['!jira show issues', '!jira find'], 'max_expensive': 1, 'max_pending': 5}
+
+
+class AdmissionTest(unittest.TestCase):
+    def setUp(self):
+        self.admission = Admission(CONFIG)
+
+    def admit(self, user='U1', channel='C1', text='!jira show issue PROJ-1', pending=0):
+        return self.admission.admit('T', user, channel, text, pending)
+
+    def test_user_is_told_once(self):
+        self.assertEqual(self.admit(), (None, None))
+        self.assertEqual(self.admit(), (None, None))
+        verdict, reply = self.admit()
+        self.assertEqual(verdict, 'throttled')
+        self.assertIn('Too many commands', reply)
+        self.assertEqual(self.admit(), ('throttled', None))
+
+    def test_channel_rejection_leaves_user_tokens(self):
+        for user in ('U1', 'U2', 'U3'):
+            self.assertEqual(self.admit(user=user), (None, None))
+        self.assertEqual(self.admit(user='U4')[0], 'throttled')
+        # U4 didn't get to run anything, so it still has both of its commands elsewhere
+        self.assertEqual(self.admit(user='U4', channel='C2'), (None, None))
+        self.assertEqual(self.admit(user='U4', channel='C2'), (None, None))
+
+    def test_only_heavy_shapes_are_expensive(self):
+        self.assertEqual(self.admit(text='!jira show issues PROJ'), (None, None))
+        self.assertEqual(self.admit(user='U2', text='!jira show issue PROJ-1'), (None, None))
+        self.assertEqual(self.admit(user='U3', text='!jira find login')[0], 'shed')
+
+        self.admission.done('!jira show issues PROJ')
+        self.assertEqual(self.admit(user='U3', text='!jira find login'), (None, None))
+
+    def test_sheds_when_too_many_wait(self):
+        self.assertEqual(self.admit(pending=5)[0], 'shed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# no slack or jira settings needed to import the bot package
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot import dedup
+from bot.dedup import Dedup, event_key
+
+
+class DedupTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dedup')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def lines(self):
+        with open(self.path) as f:
+            return f.read().splitlines()
+
+    def test_event_key(self):
+        event = {'channel': 'C1', 'ts': '1.5'}
+        self.assertEqual(event_key(event, 'T1'), 'T1:C1:1.5')
+        self.assertEqual(event_key(dict(event, client_msg_id='m'), 'T1'), 'T1:C1:m')
+
+    def test_in_memory(self):
+        seen = Dedup(600)
+        self.assertTrue(seen.claim('a'))
+        self.assertFalse(seen.claim('a'))
+        self.assertTrue(seen.claim('b'))
+
+    def test_capacity(self):
+        seen = Dedup(600, capacity=10, path=self.path)
+        for i in range(12):
+            self.assertTrue(seen.claim('k{}'.format(i)))
+
+        # the oldest went, everything else is held once
+        self.assertEqual(len(seen.ring), len(seen.keys))
+        self.assertTrue(seen.claim('k0'))
+        for i in range(5, 12):
+            self.assertFalse(seen.claim('k{}'.format(i)))
+
+    def test_window(self):
+        seen = Dedup(600)
+        self.assertTrue(seen.claim('a'))
+        seen.ring[0] = (seen.ring[0][0] - 601, seen.ring[0][1])
+        self.assertTrue(seen.claim('a'))
+
+    def test_two_processes_share_the_file(self):
+        one = Dedup(600, path=self.path)
+        other = Dedup(600, path=self.path)
+
+        self.assertTrue(one.claim('a'))
+        self.assertFalse(other.claim('a'))
+        self.assertTrue(other.claim('b'))
+        self.assertFalse(one.claim('b'))
+        self.assertEqual(len(self.lines()), 2)
+        self.assertEqual(len(one.ring), 2)
+
+    def test_restart_reads_the_file(self):
+        Dedup(600, path=self.path).claim('a')
+        self.assertFalse(Dedup(600, path=self.path).claim('a'))
+
+    def test_torn_line(self):
+        seen = Dedup(600, path=self.path)
+        self.assertTrue(seen.claim('a'))
+        # a process killed in the middle of its line
+        with open(self.path, 'a') as f:
+            f.write('{:.3f} 12'.format(time.time()))
+
+        self.assertTrue(seen.claim('b'))
+        self.assertFalse(seen.claim('b'))
+        self.assertFalse(Dedup(600, path=self.path).claim('b'))
+        self.assertEqual(len(self.lines()), 3)
+
+    def test_garbage_line(self):
+        with open(self.path, 'w') as f:
+            f.write('not a line\n')
+        seen = Dedup(600, path=self.path)
+        self.assertTrue(seen.claim('a'))
+        self.assertFalse(Dedup(600, path=self.path).claim('a'))
+
+    def test_compaction(self):
+        seen = Dedup(600, capacity=4, path=self.path)
+        other = Dedup(600, capacity=4, path=self.path)
+        seen.claim('k0')
+        inode = os.stat(self.path).st_ino
+
+        # lines are about 30 bytes, the file is rewritten past 64 bytes per key of capacity
+        for i in range(1, 12):
+            seen.claim('k{}'.format(i))
+
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertLess(len(self.lines()), 12)
+
+        # the other one starts over from the new file
+        self.assertFalse(other.claim('k11'))
+        self.assertTrue(other.claim('k0'))
+
+    def test_file_replaced(self):
+        seen = Dedup(600, path=self.path)
+        seen.claim('a')
+        os.remove(self.path)
+        # a new file, what the old one said is gone
+        self.assertTrue(seen.claim('a'))
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(dedup.fingerprint('a'), dedup.fingerprint(u'a'))
+        self.assertNotEqual(dedup.fingerprint('a'), dedup.fingerprint('b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import unittest
+from collections import namedtuple
+
+# no slack or jira settings needed to import the bot package
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.slackclient._util import EntityStore, compact
+
+Entity = namedtuple('Entity', 'id name is_im')
+
+
+def channel(id, name):
+    return Entity(id, name, False)
+
+
+def im(id):
+    return Entity(id, id.lower(), True)
+
+
+class EntityStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.loaded = []
+        self.store = EntityStore(evictable=lambda entity: entity.is_im, size=2, load=self.load)
+
+    def load(self, id):
+        self.loaded.append(id)
+        return self.store.upsert(im(id))
+
+    def test_upsert_and_find(self):
+        self.store.upsert(channel('C1', 'general'))
+        self.assertEqual(self.store.get('C1').name, 'general')
+        self.assertEqual(self.store.find('general').id, 'C1')
+        self.assertEqual(self.store.find('#general').id, 'C1')
+        self.assertEqual(self.store.find('C1').id, 'C1')
+        self.assertIsNone(self.store.find('random'))
+        self.assertIsNone(self.store.find(None))
+
+    def test_rename(self):
+        self.store.upsert(channel('C1', 'general'))
+        self.store.upsert(channel('C1', 'everyone'))
+        self.assertIsNone(self.store.find('general'))
+        self.assertEqual(self.store.find('everyone').id, 'C1')
+        self.assertEqual(len(self.store), 1)
+
+        # a name taken over by another channel stays with it
+        self.store.upsert(channel('C2', 'random'))
+        self.store.upsert(channel('C3', 'random'))
+        self.store.upsert(channel('C2', 'old-random'))
+        self.assertEqual(self.store.find('random').id, 'C3')
+
+    def test_least_recently_used_ims_are_evicted(self):
+        self.store.upsert(channel('C1', 'general'))
+        for id in ('D01', 'D02'):
+            self.store.upsert(im(id))
+
+        # D01 was used since, so D02 goes first
+        self.store.get('D01')
+        self.store.upsert(im('D03'))
+
+        self.assertEqual(sorted(entity.id for entity in self.store), ['C1', 'D01', 'D03'])
+        self.assertEqual(self.store.evictions, 1)
+        self.assertNotIn('d02', self.store.names)
+        self.assertIsNone(self.store.get('D02'))
+        self.assertEqual(self.store.get('C1').name, 'general')
+
+    def test_evicted_ims_are_loaded_again(self):
+        for id in ('D01', 'D02', 'D03'):
+            self.store.upsert(im(id))
+
+        self.assertEqual(self.store.find('D01').id, 'D01')
+        self.assertEqual(self.loaded, ['D01'])
+        # names aren't ids, they aren't looked up
+        self.assertIsNone(self.store.find('nobody'))
+        self.assertEqual(self.loaded, ['D01'])
+
+    def test_remove(self):
+        self.store.upsert(channel('C1', 'general'))
+        self.store.upsert(im('D01'))
+        self.assertEqual(self.store.remove('D01').id, 'D01')
+        self.assertEqual(self.store.remove('C1').id, 'C1')
+        self.assertIsNone(self.store.remove('C1'))
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.names, {})
+
+    def test_compact(self):
+        ids = compact([u'U1', 'U2'])
+        self.assertEqual(ids, ('U1', 'U2'))
+        self.assertIs(ids[0], compact(['U1'])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import unittest
+
+# no slack or jira settings needed to import the plugin
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.plugins.jira_plugin import indexer
+from bot.plugins.jira_plugin.indexer import IssueIndex, query_words
+
+
+def issue(key, summary, status='Open', labels=()):
+    return {'key': key, 'fields': {'summary': summary, 'status': {'name': status}, 'labels': list(labels)}}
+
+
+class IssueIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = IssueIndex()
+
+    def keys(self, query, limit=10):
+        return [found[0] for found in self.index.search(query, limit)]
+
+    def test_query_words(self):
+        # the last word is still being typed, issue keys stay whole
+        self.assertEqual(query_words('login PROJ-12 pag'), [('login', False), ('proj-12', False), ('pag', True)])
+        self.assertEqual(query_words('log* page'), [('log', True), ('page', True)])
+        self.assertEqual(query_words('  '), [])
+
+    def test_key_beats_label_beats_summary(self):
+        self.index.add(issue('PROJ-1', 'the cart page is slow'))
+        self.index.add(issue('PROJ-2', 'checkout fails', labels=['cart']))
+        self.index.add(issue('CART-3', 'nothing about it'))
+
+        self.assertEqual(self.keys('cart '), ['CART-3', 'PROJ-2', 'PROJ-1'])
+        self.assertEqual(self.index.search('cart', 1), [('CART-3', 'nothing about it', 'Open')])
+
+    def test_more_words_matched_first(self):
+        self.index.add(issue('PROJ-1', 'login login login'))
+        self.index.add(issue('PROJ-2', 'login page broken'))
+        self.assertEqual(self.keys('login broken'), ['PROJ-2', 'PROJ-1'])
+
+    def test_prefix_expansion(self):
+        self.index.add(issue('PROJ-1', 'login fails'))
+        self.index.add(issue('PROJ-2', 'the log is full'))
+        self.index.add(issue('PROJ-3', 'logout hangs'))
+
+        self.assertEqual(self.index.expand('log'), ['log', 'login', 'logout'])
+        # an exact match counts more than a longer term with the prefix
+        self.assertEqual(self.keys('log')[0], 'PROJ-2')
+        self.assertEqual(sorted(self.keys('logi')), ['PROJ-1'])
+        # only the last word is a prefix unless marked
+        self.assertEqual(self.keys('logi* x'), ['PROJ-1'])
+        self.assertEqual(self.keys('logi x'), [])
+
+    def test_expansion_keeps_the_most_common_terms(self):
+        for i in range(indexer.MAX_EXPANSIONS + 5):
+            self.index.add(issue('PROJ-{}'.format(i), 'term{}'.format(i)))
+        self.index.add(issue('PROJ-100', 'term0 term1'))
+
+        terms = self.index.expand('term')
+        self.assertEqual(len(terms), indexer.MAX_EXPANSIONS)
+        self.assertIn('term0', terms)
+        self.assertIn('term1', terms)
+
+    def test_update_and_remove(self):
+        self.index.add(issue('PROJ-1', 'login fails'))
+        self.index.add(issue('PROJ-1', 'signup fails', status='Done'))
+
+        self.assertEqual(self.keys('login'), [])
+        self.assertEqual(self.index.search('signup'), [('PROJ-1', 'signup fails', 'Done')])
+        self.assertNotIn('login', self.index.vocabulary)
+
+        self.index.remove('PROJ-1')
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.vocabulary, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import threading
+import time
+import unittest
+
+# no slack or jira settings needed to import the plugin
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.plugins.jira_plugin.pool import Pool, Busy
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.connects = 0
+        self.pool = Pool(self.connect, 2)
+
+    def connect(self):
+        self.connects += 1
+        return object()
+
+    def test_reuses_clients(self):
+        with self.pool.connection() as one:
+            pass
+        with self.pool.connection() as other:
+            self.assertIs(other, one)
+        self.assertEqual(self.connects, 1)
+
+    def test_busy_after_timeout(self):
+        held = [self.pool.acquire(), self.pool.acquire()]
+        started = time.time()
+        self.assertRaises(Busy, self.pool.acquire, 0.05)
+        self.assertGreaterEqual(time.time() - started, 0.05)
+        self.assertEqual(self.connects, 2)
+        self.assertEqual(self.pool.waits, 1)
+
+        # a client handed back meanwhile is taken
+        threading.Timer(0.05, self.pool.release, [held[0]]).start()
+        self.assertIs(self.pool.acquire(5), held[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
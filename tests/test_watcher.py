@@ -0,0 +1,101 @@
+import os
+import unittest
+
+# no slack or jira settings needed to import the plugin
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.plugins.jira_plugin import utils
+from bot.plugins.jira_plugin.watcher import Watches
+
+CREATED = '2020-01-01T10:00:00.000+0000'
+SINCE = utils.parse_time('2020-01-02T00:00:00.000+0000')
+
+
+def issue(key, status='Open', updated=CREATED, created=CREATED, labels=()):
+    return {'key': key, 'fields': {'summary': 'about ' + key, 'status': {'name': status}, 'labels': list(labels),
+                                   'created': created, 'updated': updated}}
+
+
+class FakeJira(object):
+    def __init__(self, open_issues):
+        self.open_issues = open_issues
+        self.updated = []
+        self.queries = []
+
+    def search_issues(self, query, startAt=0, maxResults=50, fields=None, json_result=False):
+        self.queries.append(query)
+        issues = self.updated if 'updated >=' in query else self.open_issues
+        return {'issues': issues[startAt:startAt + maxResults], 'total': len(issues)}
+
+
+class ChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.watches = Watches(None)
+
+    def test_new_issue(self):
+        created = '2020-01-02T10:00:00.000+0000'
+        self.assertEqual(self.watches.changes(issue('P-1', created=created), SINCE), (['new'], None))
+        self.assertEqual(self.watches.changes(issue('P-2', created=created, labels=['fire']), SINCE),
+                         (['new', 'fires'], None))
+
+    def test_unseen_old_issue(self):
+        # not primed as open, so it was reopened; a done one isn't news
+        self.assertEqual(self.watches.changes(issue('P-1'), SINCE), (['status'], None))
+        self.assertEqual(self.watches.changes(issue('P-2', status='Done'), SINCE), ([], None))
+
+    def test_seen_issue(self):
+        self.watches.remember(issue('P-1'))
+
+        # the same update again is nothing new
+        self.assertEqual(self.watches.changes(issue('P-1'), SINCE), ([], 'Open'))
+
+        moved = issue('P-1', status='In Progress', updated='2020-01-02T10:00:00.000+0000')
+        self.assertEqual(self.watches.changes(moved, SINCE), (['status'], 'Open'))
+
+        burning = issue('P-1', status='In Progress', updated='2020-01-02T11:00:00.000+0000', labels=['fire'])
+        self.assertEqual(self.watches.changes(burning, SINCE), (['fires'], 'In Progress'))
+
+
+class PollTest(unittest.TestCase):
+    def setUp(self):
+        self.posts = []
+        self.watches = Watches(None)
+        self.watches.add('T', 'C1', 'P', 'all')
+        self.watches.add('T', 'C2', 'P', 'fires')
+
+    def poll(self, jira):
+        self.watches.poll(jira, lambda team, channel, message: self.posts.append((team, channel, message)))
+
+    def test_first_poll_primes(self):
+        jira = FakeJira([issue('P-1'), issue('P-2')])
+        self.poll(jira)
+
+        # open issues are remembered, nothing is posted, changes are looked for from now on
+        self.assertEqual(self.posts, [])
+        self.assertEqual(sorted(self.watches.seen), ['P-1', 'P-2'])
+        self.assertIn('P', self.watches.primed)
+        self.assertIn('P', self.watches.watermarks)
+        self.assertEqual(len(jira.queries), 1)
+
+    def test_changes_go_to_their_watchers(self):
+        jira = FakeJira([issue('P-1'), issue('P-2')])
+        self.poll(jira)
+
+        jira.updated = [issue('P-1'),
+                        issue('P-2', status='Done', updated='2020-01-03T10:00:00.000+0000')]
+        self.poll(jira)
+
+        # primed once, P-1 didn't change, the status change is only wanted by C1
+        self.assertEqual(len(jira.queries), 2)
+        self.assertEqual(len(self.posts), 1)
+        team, channel, message = self.posts[0]
+        self.assertEqual((team, channel), ('T', 'C1'))
+        self.assertTrue(message.startswith('Open -> Done: P-2 about P-2 [Done]'))
+
+        jira.updated = [issue('P-1', updated='2020-01-03T11:00:00.000+0000', labels=['fire'])]
+        self.poll(jira)
+        self.assertEqual(sorted(channel for _, channel, _ in self.posts[1:]), ['C1', 'C2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
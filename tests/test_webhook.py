@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+# no slack or jira settings needed to import the plugin
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.plugins.jira_plugin import webhook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+UPDATED = {'webhookEvent': 'jira:issue_updated', 'issue': {'key': 'PROJ-1', 'fields': {}}}
+
+
+class WebhookTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        webhook.listeners[:] = [lambda event, payload: self.events.append((event, payload))]
+
+    def tearDown(self):
+        webhook.listeners[:] = []
+
+    def test_dispatch(self):
+        webhook.dispatch(json.dumps(UPDATED).encode('utf-8'))
+        self.assertEqual(self.events, [('jira:issue_updated', UPDATED)])
+
+    def test_dispatch_rejects_other_json(self):
+        for body in (b'[1, 2]', b'"text"', b'null', b'{'):
+            self.assertRaises(ValueError, webhook.dispatch, body)
+        self.assertEqual(self.events, [])
+
+    def test_refuses_other_hosts_without_secret(self):
+        with self.assertRaises(Exception) as raised:
+            webhook.start(0, '')
+        self.assertIn('jira_webhook_secret', str(raised.exception))
+
+    def test_replay(self):
+        server = webhook.start(0)
+        directory = tempfile.mkdtemp()
+        try:
+            # good payloads after ones that are json but not objects
+            path = os.path.join(directory, 'payloads.json')
+            with open(path, 'w') as f:
+                f.write('[1, 2]\n{0}\n"text"\n{0}\n'.format(json.dumps(UPDATED)))
+
+            url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+            replay = [sys.executable, os.path.join(ROOT, 'bin', 'webhook-replay'), '--url', url, path]
+            with open(os.devnull, 'w') as devnull:
+                subprocess.check_call(replay, stdout=devnull)
+
+            # the router thread survives the bad ones and gets both good ones
+            deadline = time.time() + 5
+            while len(self.events) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.events, [('jira:issue_updated', UPDATED)] * 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
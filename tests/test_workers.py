@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# no slack or jira settings needed to import the bot package
+os.environ['BOT_OFFLINE'] = '1'
+
+from bot.slackclient._util import EntityStore
+from bot.workers import WorkerPool
+
+PLUGIN = '''import time
+
+
+def on_message(msg, server):
+    time.sleep(float(msg['text']))
+    return 'answer ' + msg['text']
+'''
+
+
+class Stub(object):
+    pass
+
+
+class FakeSlack(object):
+    def __init__(self):
+        self.sent = []
+        self.server = Stub()
+        self.server.users = EntityStore()
+
+    def rtm_send_message(self, channel, message):
+        self.sent.append((channel, message))
+
+
+def slow(msg, server):
+    time.sleep(float(msg['text']))
+    return 'answer ' + msg['text']
+
+
+class WorkerPoolTest(unittest.TestCase):
+    hooks = {'message': [slow]}
+    pluginpath = None
+
+    def setUp(self):
+        self.server = Stub()
+        self.server.team = 'T'
+        self.server.metrics = {'responses': 0}
+        self.server.slack = FakeSlack()
+        self.done = []
+        self.pool = WorkerPool(2, self.pluginpath, {'worker_timeout': 1}, self.hooks)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def submit(self, channel, text):
+        self.pool.submit(self.server, {'channel': channel, 'text': text}, lambda: self.done.append(text))
+
+    def collect(self, count):
+        deadline = time.time() + 10
+        while len(self.server.slack.sent) < count and time.time() < deadline:
+            self.pool.collect([self.server])
+            time.sleep(0.01)
+        return self.server.slack.sent
+
+    def test_replies_in_order_per_channel(self):
+        self.submit('C1', '0.3')
+        self.submit('C1', '0')
+        self.submit('C2', '0')
+
+        # C2 doesn't wait for C1, C1's quick one waits for the slow one before it
+        self.assertEqual(self.collect(3), [('C2', 'answer 0'), ('C1', 'answer 0.3'), ('C1', 'answer 0')])
+        self.assertEqual(sorted(self.done), ['0', '0', '0.3'])
+        self.assertEqual(self.pool.depth(), 0)
+        self.assertFalse(self.pool.waiting)
+
+    def test_timeout_then_late_answer(self):
+        self.submit('C1', '1.5')
+        self.submit('C1', '0')
+
+        sent = self.collect(3)
+        self.assertIn('taking longer than 1s', sent[0][1])
+        self.assertEqual(sent[1:], [('C1', 'answer 0'), ('C1', 'answer 1.5')])
+        self.assertEqual(self.pool.stats['timeouts'], 1)
+        self.assertEqual(self.pool.stats['late'], 1)
+        self.assertEqual(sorted(self.done), ['0', '1.5'])
+
+
+class ProcessWorkerPoolTest(WorkerPoolTest):
+    hooks = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pluginpath = tempfile.mkdtemp()
+        with open(os.path.join(cls.pluginpath, 'slow.py'), 'w') as f:
+            f.write(PLUGIN)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.pluginpath)
+
+    def test_restart(self):
+        self.submit('C1', '5')
+        time.sleep(0.2)
+        busy = [worker for worker in self.pool.workers if worker.pending][0]
+        busy.proc.kill()
+        busy.proc.wait()
+
+        # the lost message is finished and the channel isn't held up by it
+        self.submit('C1', '0')
+        self.assertEqual(self.collect(1), [('C1', 'answer 0')])
+        self.assertEqual(self.pool.stats['restarts'], 1)
+        self.assertEqual(self.pool.stats['lost'], 1)
+        self.assertEqual(sorted(self.done), ['0', '5'])
+        self.assertTrue(all(worker.alive() for worker in self.pool.workers))
+
+
+if __name__ == '__main__':
+    unittest.main()